@@ -0,0 +1,169 @@
+'''
+    Bulk analysis: the robot's best move in every position of a file, without playing any game.
+
+    The positions are read one per line, written the way dame.read_position reads them
+    (like W:Wc3,e3,Kd4:Bb6,Kf8), empty lines and lines starting with # are skipped.
+    Every position is searched by a Dame_AI in a pool of worker processes, and the results are written
+    as lines of JSON in the same order as the positions came in, as soon as they're ready:
+
+        {"line": 3, "position": "W:Wc3,e3:Bd6,f6", "move": "c3-d4", "score": 2, "depth": 3,
+         "line_of_play": ["c3-d4", "d6-c5", "d4xb6"], "nodes": 1234, "ms": 12.5}
+
+    "line" is the line number in the input. The score is for the player to move, "win" or "loss"
+    if that's certain, and the move is null if the player to move has no move at all. A position that
+    can't be read gets {"line": ..., "position": ..., "error": "what's wrong with it"} instead.
+
+    Only a few positions per worker are read ahead of the ones being written, so files of any size
+    can be analysed, and the output can be read while the rest is still being worked on.
+
+        python analyse.py positions.txt --depth 4 --workers 4 --out analysis.jsonl
+        cat puzzles.txt | python analyse.py --time 500
+'''
+
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import dame_ai as dai
+import dame as dm
+from engine import transposition as tt
+import tablebase as tb
+
+
+# Positions read ahead per worker
+AHEAD = 4
+
+# What a worker process keeps between positions: a robot for each colour, sharing one table
+_robots = {}
+
+def _start_worker(table_mb: float, tablebase: str, quiescence: int):
+    table = tt.TranspositionTable(table_mb)
+    endgames = tb.Tablebase(tablebase) if tablebase is not None else None
+
+    for for_white in (True, False):
+        _robots[for_white] = dai.Dame_AI(None, for_white, table, tablebase=endgames, quiescence=quiescence)
+
+
+def _score(score: float):
+    '''
+        A search score as JSON can take it.
+    '''
+    if score == float('inf'):
+        return 'win'
+    if score == -float('inf'):
+        return 'loss'
+    return int(score)
+
+
+def analyse(number: int, position: str, depth: int = None, time_limit: float = None):
+    '''
+        Runs in a worker process: the robot's best move in a position, as the line to write for it.
+    '''
+    result = {'line': number, 'position': position}
+    try:
+        board, white_pieces, black_pieces, for_white = dm.read_position(position)
+    except ValueError as error:
+        result['error'] = str(error)
+        return result
+
+    robot = _robots[for_white]
+    robot.game = dm.Dame(board, white_pieces, black_pieces)
+    robot.nodes = 0
+
+    start = time.perf_counter()
+    if time_limit is not None:
+        move, score, depth = robot.think(time_limit)
+    else:
+        move, score = robot.choose_move(depth)
+
+    result.update({
+        'move': dm.turn_name(move) if move is not None else None,
+        'score': _score(score),
+        'depth': depth,
+        'line_of_play': [dm.turn_name(turn) for turn in robot.line] if move is not None else [],
+        'nodes': robot.nodes,
+        'ms': round((time.perf_counter() - start) * 1000, 3),
+    })
+    return result
+
+
+def positions(lines):
+    '''
+        The (line number, position) of every line that has a position on it.
+    '''
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield number, line
+
+
+def run(lines, out, depth: int = None, time_limit: float = None, workers: int = 1, table_mb: float = 32,
+        tablebase: str = None, quiescence: int = dai.QUIESCENCE_NODES):
+    '''
+        Analyses the positions of lines (any iterable of lines, read as it goes) in a pool of workers processes,
+        writing the results to the file out in input order. Returns how many positions were analysed
+        and how many couldn't be read.
+    '''
+    if (depth is None) == (time_limit is None):
+        raise ValueError("Analysing needs either a depth or a time limit, not both.")
+
+    analysed = errors = 0
+    with ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(table_mb, tablebase, quiescence)) as pool:
+        pending = deque()
+
+        def write_oldest():
+            nonlocal analysed, errors
+            result = pending.popleft().result()
+            errors += 'error' in result
+            analysed += 'error' not in result
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+
+        for number, position in positions(lines):
+            pending.append(pool.submit(analyse, number, position, depth, time_limit))
+            if len(pending) >= workers * AHEAD:
+                write_oldest()
+
+        while pending:
+            write_oldest()
+
+    return analysed, errors
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Find the robot's best move in every position of a file.")
+    parser.add_argument('positions', nargs='?', default='-', help="file with one position per line, - for the console")
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument('--depth', type=int, default=None, help="how many moves ahead the robot looks (3 if no --time)")
+    limit.add_argument('--time', type=float, default=None, help="milliseconds the robot thinks per position")
+    parser.add_argument('--workers', type=int, default=1, help="number of positions analysed at once")
+    parser.add_argument('--out', default='-', help="JSONL file to write the results to, - for the console")
+    parser.add_argument('--table-mb', type=float, default=32, help="size of each worker's transposition table")
+    parser.add_argument('--tablebase', default=None, help="endgame tablebase directory")
+    parser.add_argument('--quiescence', type=int, default=dai.QUIESCENCE_NODES,
+                        help="positions to play out captures for at the end of every line, 0 for none")
+    args = parser.parse_args(argv)
+
+    depth = args.depth if args.depth is not None or args.time is not None else 3
+
+    source = sys.stdin if args.positions == '-' else open(args.positions)
+    out = sys.stdout if args.out == '-' else open(args.out, 'w')
+    start = time.perf_counter()
+    try:
+        analysed, errors = run(source, out, depth, args.time, args.workers, args.table_mb, args.tablebase,
+                               args.quiescence)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Analysed {analysed} positions in {time.perf_counter() - start:.1f}s"
+          f"{f', {errors} could not be read' if errors else ''}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 import numpy as np
-from itertools import product
+from functools import wraps
 
-from mainmenu import MainMenu
-import dame_ai as dai
+from engine import bitboard as bb
+from engine import evaluation as ev
+from engine import Move, mirror_move, square_name, turn_name
+import engine
 
 
 # Non-Object-Functions to speed up robots, as fast robots are cool. 
@@ -13,40 +15,46 @@ name = {
     False: "Black"
 }
 
-def can_jump(board:np.array, white_pieces:list, black_pieces:list, for_white:bool):
+class BoardState:
+    '''
+        A board and the pieces of both players on it (bitboard.Pieces), which the functions below keep in step
+        (they all change them through _lift and _place).
+
+        It unpacks into the board, the white pieces and the black pieces, the way the functions take them:
+        make_turn(*state, turn, for_white). Pieces given as plain lists of squares are read off the board.
+    '''
+
+    __slots__ = ('board', 'white_pieces', 'black_pieces')
+
+    def __init__(self, board: np.array, white_pieces = None, black_pieces = None):
+        self.board = board
+        self.white_pieces = white_pieces if type(white_pieces) is bb.Pieces else bb.Pieces.of(board, True)
+        self.black_pieces = black_pieces if type(black_pieces) is bb.Pieces else bb.Pieces.of(board, False)
+
+    def __iter__(self):
+        return iter((self.board, self.white_pieces, self.black_pieces))
+
+    def copy(self):
+        return BoardState(self.board.copy(), self.white_pieces.copy(), self.black_pieces.copy())
+
+
+def can_jump(board:np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, for_white:bool):
     '''
         Check if a player can make some sort of a jump on a board.
     '''
-    your_pieces = white_pieces if for_white else black_pieces
-    enemy_pieces = [2,4] if for_white else [1,3]
-    main_dir = -1 if for_white else 1
-
-    for x,y in your_pieces:
-
-        # listing every way a jump could be made
-        dir_to_check = list(product([1,-1],[main_dir]))
-        if board[x,y]>2:
-            dir_to_check += list(product([1,-1],[-main_dir]))
-
-        for dx,dy in dir_to_check:
-            if 0 <= x+2*dx < 8 and 0 <= y+2*dy < 8:
-                if board[x+dx,y+dy] in enemy_pieces and board[x+2*dx,y+2*dy] == 0:
-                    # print(f"{(x,y)} can jump over {(x+dx,y+dy)}")
-                    # valid jump found
-                    return True
-    
-    # nobody can make a single jump on the whole board.
-    return False
+    return bb.can_jump(for_white, *bb.bitboards(board, white_pieces, black_pieces))
 
 
-def is_move_valid(board, white_pieces, black_pieces, fro: tuple, to: tuple, for_white: bool, verbose: bool = True):
+def is_move_valid(board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, fro: tuple, to: tuple,
+                  for_white: bool, verbose: bool = True):
     '''
         Examines the validity of a player moving from "fro" to "to".
 
         Player is white iff for_white is True
         fro and to are tuples with the indices of the places in self.board
 
-        If you must jump, you must jump. 
+        If you must jump, you must jump. The move has to be the first step of one of
+        the whole turns the player can take (see legal_moves).
 
         In verbose mode, shows a "helpful" message if your move cannot be moved
     '''
@@ -60,7 +68,6 @@ def is_move_valid(board, white_pieces, black_pieces, fro: tuple, to: tuple, for_
         
     # Do you have a piece there?
     your_pieces = [1, 3] if for_white else [2, 4]
-    enemy_pieces = [2, 4] if for_white else [1, 3]
 
     if board[xf,yf] not in your_pieces:
         if verbose:
@@ -73,138 +80,164 @@ def is_move_valid(board, white_pieces, black_pieces, fro: tuple, to: tuple, for_
             print("There is something in the way.")
         return False
 
-    # Is move legal?
+    # Is move legal? It is if some whole turn starts with it.
+    moves = legal_moves(for_white, board, white_pieces, black_pieces)
+    if (fro, to) in moves.steps:
+        return True
 
-    # check if a jump is available
-    if can_jump(board, white_pieces, black_pieces, for_white) and abs(xto-xf) != 2:
-        if verbose:
+    if verbose: # Why not
+        if moves.must_jump and abs(xto-xf) != 2:
             print("You have to jump! It's the only way!")
-        return False
-
-    main_dir = -1 if for_white else 1
-    if abs(xf-xto) != 2: # regular step
-
-        # You're either moving forward or are moving a super piece
-        legal = (abs(xto-xf) == 1 and abs(yto-yf)==1) and (yto-yf == main_dir or board[xf,yf] > 2)
-        if verbose and not legal:
+        elif abs(xto-xf) != 2:
             print("That is an evil, illegal move.")
-        return legal
-    
-    else: # jump
-
-        # Same as before, plus you are jumping over someone for real
-        legal = (abs(yto-yf)==2 and (yto-yf == 2*main_dir or board[xf,yf] > 2) and
-                 board[(xto+xf)//2, (yto+yf)//2] in enemy_pieces)
-        if verbose and not legal:
+        else:
             print("You can't jump over thin air. That's literally impossible.")
-        return legal
-    
-    print("Huh?") #something went terribly wrong
-    return None
-        
-def list_valid_moves(for_white:bool, board:np.array, white_pieces:list, black_pieces:list):
+    return False
+
+def list_valid_moves(for_white:bool, board:np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces):
     '''
         Makes a list of all possible moves that a player can make on a board.
         The moves are in the from of tuples.
+
+        The moves are generated on bitboards (see engine/bitboard.py), all pieces at once.
     '''
 
-    moves = []
-    your_pieces = white_pieces if for_white else black_pieces
-    enemy_pieces = [2,4] if for_white else [1,3]
-    main_dir = -1 if for_white else 1
+    return [(bb.SQUARES[fro], bb.SQUARES[to])
+            for fro, to in bb.generate_moves(for_white, *bb.bitboards(board, white_pieces, black_pieces))]
 
-    for x,y in your_pieces:
+def list_valid_moves_batch(for_white, boards:np.array):
+    '''
+        list_valid_moves for a whole (N, 8, 8) array of boards (or (N, 4) array of bitboards) at once.
+        for_white is a bool, or one bool per board.
 
-        # Check the 2/4 possible ways a piece could go. This is rumored to be okay.
-        moves_to_check = list(product([-1,1],[main_dir]))
-        if board[x,y] > 2: #super piece
-            moves_to_check += list(product([-1,1],[-main_dir]))
+        Returns (moves, offsets): moves is an (M, 2, 2) array of ((x, y) from, (x, y) to) pairs,
+        the moves of board i are moves[offsets[i]:offsets[i+1]], in the same order list_valid_moves gives them.
+    '''
 
-        for dx,dy in moves_to_check:
+    moves, offsets = bb.generate_moves_batch(for_white, boards)
+    return np.array(bb.SQUARES)[moves].reshape(-1, 2, 2), offsets
 
-            # If there's an enemy hre, check if you can jump over.
-            try:
-                if board[x+dx,y+dy] in enemy_pieces: #Just in case we reach out of the board
-                    dx*=2
-                    dy*=2
-            except:
-                pass
+def generate_turns(for_white:bool, board:np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces):
+    '''
+        Yields every whole turn a player can take on a board as a Move.
 
-            if is_move_valid(board, white_pieces, black_pieces, (x,y), (x+dx, y+dy), for_white, verbose = False):
-                moves.append(( (x,y),(x+dx,y+dy) ))
-                    
-    return moves
+        Unlike list_valid_moves, a jump comes with all the jumps the piece has to make after it,
+        so a turn is always finished when the other player comes.
+    '''
 
-def eval_board(board, white_pieces, black_pieces, for_white: bool):
+    for turn in bb.generate_turns(for_white, *bb.bitboards(board, white_pieces, black_pieces)):
+        yield engine.move_of(turn)
 
+class LegalMoves:
     '''
-        Gives an int score based on how good the position is for a player.
-        The better the position, the higher the score.
+        Everything a player can do in a position (see legal_moves):
 
-        Things the score takes into account:
+            turns:      every whole turn (Move) the player can take, in generate_turns order
+            must_jump:  whether the player has to jump (then every turn is a jump)
+            steps:      the (fro, to) first steps of the turns, to check moves typed in against
+    '''
 
-            + Number of pieces
-            + Number of super pieces
-            + Can you jump over an enemy piece
+    __slots__ = ('turns', 'must_jump', 'steps')
+
+    def __init__(self, turns: tuple):
+        self.turns = turns
+        self.must_jump = len(turns) > 0 and len(turns[0].captured) > 0
+        self.steps = frozenset(turn.path[:2] for turn in turns)
 
-            - Similar things but for the enemy                       
+    def __len__(self):
+        return len(self.turns)
+
+    def __iter__(self):
+        return iter(self.turns)
+
+    def goes_on(self, path: tuple):
+        '''
+            Whether a turn that went through the squares of path so far has more jumps to make.
+        '''
+        return any(len(turn.path) > len(path) and turn.path[:len(path)] == path for turn in self.turns)
+
+def legal_moves(for_white: bool, board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces):
     '''
+        The LegalMoves of a player on a board.
 
-    score = 0
+        The turns come from engine.Position.moves, which remembers the last few thousand positions asked about,
+        so the game checking a move, checking if it's over and the robot choosing its move (at the root of
+        its search, see engine.Search.search) all share one look at the position.
+        Deeper down the search lists the moves itself, it looks at far too many positions to remember.
+    '''
+    return LegalMoves(engine.Position(*bb.bitboards(board, white_pieces, black_pieces), for_white).moves())
 
-    your_pieces = white_pieces if for_white else black_pieces
-    enemy_pieces = black_pieces if for_white else white_pieces
+def eval_board(board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, for_white: bool):
 
-    for x,y in your_pieces:
+    '''
+        Gives an int score based on how good the position is for a player.
+        The better the position, the higher the score.
 
-        # Head count
+        Things the score takes into account:
 
-        score += 2 # +1 points per piece alive
-        if board[x,y] > 2:
-            score += 2 # +1 points per super piece
+            + Number of pieces
+            + Number of super pieces
+            + Can you jump over an enemy piece
 
-        #score += len(list_valid_moves(for_white, board, white_pieces, black_pieces)) # +1 point for each potential legal move.
+            - Similar things but for the enemy
 
-        frwrd = [-1] if for_white else [1]
-        bckwrd = [1] if for_white else [-1]
+        The terms only look at the squares around each piece, they're precomputed
+        in engine/evaluation.py so this is just a handful of table lookups per piece.
+    '''
 
-        # Examining Weakness
+    return ev.evaluate(ev.board_codes(board), for_white)
 
-        for dx,dy in product([-1,1],frwrd):
-            try:
-                if (x+dx, y+dy) in enemy_pieces and board[x-dx,y-dy] == 0:
-                    score -= 3 # -3 points for each jump the opponent can make over you
-            except:
-                pass  # Ha kinyúlnánk a táblából (ez a komment valamiért magyarra sikerült, de nem javítom át.)
+def _lift(board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, square: tuple):
+    """
+    Takes the piece on square off the board and out of its player's pieces, returns its code.
+    This and _place are the only places the board and the pieces are changed, so they can't disagree.
+    """
+    piece = board[square]
+    (white_pieces if piece % 2 else black_pieces).remove(square)
+    board[square] = 0
+    return piece
 
-        for dx,dy in product([-1,1],bckwrd):
-            try:
-                if (board[x+dx,y+dy] > 2 and 
-                    (x+dx, y+dy) in enemy_pieces and board[x-dx,y-dy] == 0):
-                    score -= 3 # -3 points for each super jump the opponent can make over you
-            except:
-                pass # Ha kinyúlnánk a táblából
+def _place(board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, square: tuple, piece: int):
+    """
+    Puts a piece (its code) on an empty square, of the board and of its player's pieces.
+    """
+    (white_pieces if piece % 2 else black_pieces).add(square, piece > 2)
+    board[square] = piece
 
-        # Examining Power
-        
-        for dx,dy in product([-1,1],frwrd):
-            try:
-                if (x+dx, y+dy) in enemy_pieces and board[x+2*dx,y+2*dy] == 0:
-                    score += 2 # +2 points for each jump you can make over your opponent.
-            except:
-                pass # Ha kinyúlnánk a táblából
-
-        for dx,dy in product([-1,1],bckwrd):
-            try:
-                if (board[x,y] > 2 and 
-                    (x+dx, y+dy) in enemy_pieces and board[x+2*dx,y+2*dy] == 0):
-                    score += 10 # +2 points for each super jump you can make over your opponent.
-            except:
-                pass # Ha kinyúlnánk a táblából
-
-    return score
-
-def move(board, white_pieces, black_pieces, fro: tuple, to: tuple, for_white: bool, verbose: bool = False):
+def _as_pieces(board: np.array, squares):
+    """
+    A player's pieces as bitboard.Pieces: as they are if they already are, else made from a list of their squares.
+    """
+    if type(squares) is bb.Pieces:
+        return squares
+    pieces = bb.Pieces()
+    for square in squares:
+        pieces.add(square, board[square] > 2)
+    return pieces
+
+def _takes_lists(change):
+    """
+    Lets a function that changes a position also be given the pieces as plain lists of squares,
+    the way the game used to keep them. It works on bitboard.Pieces made from the lists, which get
+    the squares written back afterwards, so the board and the lists still agree.
+    """
+    @wraps(change)
+    def changing(board: np.array, white_pieces, black_pieces, *args, **kwargs):
+        if type(white_pieces) is bb.Pieces and type(black_pieces) is bb.Pieces:
+            return change(board, white_pieces, black_pieces, *args, **kwargs)
+
+        white, black = _as_pieces(board, white_pieces), _as_pieces(board, black_pieces)
+        result = change(board, white, black, *args, **kwargs)
+        for given, pieces in ((white_pieces, white), (black_pieces, black)):
+            if given is not pieces:
+                given[:] = list(pieces)
+        return result
+
+    return changing
+
+@_takes_lists
+def move(board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, fro: tuple, to: tuple, for_white: bool,
+         verbose: bool = False):
     """
     Moves the piece on 'fro' to 'to'.
     Assumes the input is all good in all the ways.
@@ -214,65 +247,114 @@ def move(board, white_pieces, black_pieces, fro: tuple, to: tuple, for_white: bo
 
     If a regular piece reaches the opposite side, promote it to super piece.
     """
-    your_pieces = white_pieces if for_white else black_pieces
-
     # Moving the piece and leaving nothing behind
-
-    board[to] = board[fro]
-    board[fro] = 0
-
-    your_pieces.remove(fro)
-    your_pieces.append(to)
+    piece = _lift(board, white_pieces, black_pieces, fro)
 
     # Check for promotion (other side + regular piece)
-    if to[1] == 7 - int(for_white) * 7 and board[to] < 3:
-        board[to] += 2
+    if to[1] == 7 - int(for_white) * 7 and piece < 3:
+        piece += 2
         if verbose:
             print(f"The {name[for_white]} piece reaches the enemy lines! Promoted!")
 
-    # (For the needy functions)
-    to = np.array(to)
-    fro = np.array(fro)
-
+    _place(board, white_pieces, black_pieces, to, piece)
 
     # Remove over-jumped piece forever
     if abs(to[0] - fro[0]) == 2 and abs(to[1] - fro[1]) == 2:
-
-        enemy_pieces = black_pieces if for_white else white_pieces
-
-        ovx, ovy = (fro+to)//2
-        board[ovx,ovy] = 0
-        enemy_pieces.remove((ovx,ovy))
+        _lift(board, white_pieces, black_pieces, ((fro[0] + to[0])//2, (fro[1] + to[1])//2))
         return True
-    
+
     return False
 
+@_takes_lists
+def make_move(board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, fro: tuple, to: tuple, for_white: bool):
+    """
+    Does the same as move, but in a way that can be taken back:
+    returns an undo record to give to unmake_move.
+
+    Made for walking a single board back and forth (like perft does)
+    instead of copying it for every move looked at.
+    The pieces are edited in place (lists of squares too, see _takes_lists).
+    """
+    piece = _lift(board, white_pieces, black_pieces, fro)
+    landed = piece + 2 if piece < 3 and to[1] == 7 - int(for_white) * 7 else piece # Promotion
+    _place(board, white_pieces, black_pieces, to, landed)
+
+    # Remove over-jumped piece (for now)
+    captured = None
+    if abs(to[0] - fro[0]) == 2:
+        captured = _lift(board, white_pieces, black_pieces, ((fro[0] + to[0])//2, (fro[1] + to[1])//2))
+
+    return fro, to, for_white, piece, captured
+
+@_takes_lists
+def unmake_move(board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, undo: tuple):
+    """
+    Takes back a move made by make_move, leaving the board and pieces exactly as they were.
+    """
+    fro, to, for_white, piece, captured = undo
+
+    _lift(board, white_pieces, black_pieces, to)
+    _place(board, white_pieces, black_pieces, fro, piece)
+
+    if captured is not None:
+        _place(board, white_pieces, black_pieces, ((fro[0] + to[0])//2, (fro[1] + to[1])//2), captured)
+
+def make_turn(board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, turn: Move, for_white: bool):
+    """
+    Makes all the moves of a whole turn with make_move, returns the undo records for unmake_turn.
+    """
+    path = turn.path
+    return [make_move(board, white_pieces, black_pieces, path[i], path[i+1], for_white)
+            for i in range(len(path) - 1)]
+
+def unmake_turn(board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, undos: list):
+    """
+    Takes back a turn made by make_turn.
+    """
+    for undo in reversed(undos):
+        unmake_move(board, white_pieces, black_pieces, undo)
+
+def read_position(text: str):
+    '''
+        Reads a position written like "W:Wc3,e3,Kd4:Bb6,Kf8" (as position_text writes it):
+        the player to move (W or B), then the white pieces and the black pieces, K marks a super piece.
+
+        Returns the board, the white and black pieces and whether white is to move.
+        Raises ValueError if the text makes no sense.
+    '''
+    position = engine.Position.read(text)
+    board = position.board()
+    return board, bb.Pieces(position.wm, position.wk), bb.Pieces(position.bm, position.bk), position.white_to_move
+
+def position_text(board: np.array, white_to_move: bool):
+    '''
+        Writes a position down the way read_position reads it.
+    '''
+    return engine.Position.from_board(board, white_to_move).text()
+
 class Dame:
     '''
         The main managing class of the game dame (or checkers, by its actual boring name).
     '''
 
-    def __init__(self, board: np.array = None, white_pieces: list = None, black_pieces: list = None,
+    def __init__(self, board: np.array = None, white_pieces: bb.Pieces = None, black_pieces: bb.Pieces = None,
                  interactive: bool = False):
         '''
             Makes a board in a starting state, or in a given state if a state is given.
+            The board and pieces are kept together in self.state (a BoardState).
         '''
 
         # The Board
         if board is None: # Starting position
-            self.board = np.zeros([8,8], dtype=int)
+            board = np.zeros([8,8], dtype=int)
 
             # Place White pieces
-        
-            self.white_pieces = []
-            self.black_pieces = []
             offs = 1
             for y in range(5,8):
                 offs = 1-offs
                 for i in range(4):
                     x = offs + 2*i
-                    self.board[x,y] = 1
-                    self.white_pieces.append((x,y))
+                    board[x,y] = 1
 
             # Place Black pieces
             offs = 0
@@ -280,13 +362,9 @@ class Dame:
                 offs = 1-offs
                 for i in range(4):
                     x = offs + 2*i
-                    self.board[x,y] = 2
-                    self.black_pieces.append((x,y))
+                    board[x,y] = 2
 
-        else: # given start state
-            self.board = board
-            self.white_pieces = white_pieces
-            self.black_pieces = black_pieces
+        self.state = BoardState(board, white_pieces, black_pieces)
 
         if interactive: # We don't need these when making hypothetical games (for the robot)
 
@@ -316,6 +394,18 @@ class Dame:
                 col: char for char, col in self.char_to_col.items() # A fenti inverze
             }
 
+    @property
+    def board(self):
+        return self.state.board
+
+    @property
+    def white_pieces(self):
+        return self.state.white_pieces
+
+    @property
+    def black_pieces(self):
+        return self.state.black_pieces
+
     def print_board(self):
         '''
             Draws the board to the console
@@ -424,7 +514,13 @@ class Dame:
         '''
         A player keeps trying to make moves until they can,
         then the other.
+
+        A piece that jumped has to keep jumping while it can,
+        the moves typed in have to follow one of the whole turns the player could take.
         '''
+
+        turns = self.legal_moves(for_white)
+        path = () # Where the moving piece has been this turn
     
         turn_done = False
         while not turn_done:
@@ -435,25 +531,23 @@ class Dame:
             
             # Move examination
             fro,to = move
-            valid = self.is_move_valid(fro, to, for_white)
+
+            if path: # Halfway through jumping
+                valid = fro == path[-1] and any(turn.path[:len(path)+1] == path + (to,) for turn in turns)
+                if not valid:
+                    print(f"The piece on {self.col_to_char[path[-1][0]] + str(8-path[-1][1])} has to keep jumping.")
+            else:
+                valid = self.is_move_valid(fro, to, for_white)
 
             if valid:
 
                 print(f"{name[for_white]} moves from {self.col_to_char[fro[0]] + str(8-fro[1])} to {self.col_to_char[to[0]] + str(8-to[1])}.")
-                turn_done = not self.move(fro, to, for_white, verbose=True) # Stays as True if you jump
-
-                if not turn_done:
-
-                    # Check to see if the jumping piece can jump again
-                    turn_done = True
-
-                    for (xf,yf), (xto,_) in self.list_valid_moves(for_white):
+                jumped = self.move(fro, to, for_white, verbose=True)
 
-                        # We found the jumper, can he jump again?
-                        if (xf,yf) == to and abs(xf-xto) == 2:
-                            turn_done = False
-                            break
+                path = (path or (fro,)) + (to,)
+                turn_done = not turns.goes_on(path)
 
+                if jumped:
                     print(f"It't a clean kill!{int(not turn_done) * ' keep going!'}")
                     if not turn_done:
                         self.print_board()
@@ -472,6 +566,18 @@ class Dame:
         '''
         return list_valid_moves(for_white, self.board, self.white_pieces, self.black_pieces)
 
+    def generate_turns(self, for_white: bool):
+        '''
+            Yields every whole turn a player can take, as a Move.
+        '''
+        return generate_turns(for_white, self.board, self.white_pieces, self.black_pieces)
+
+    def legal_moves(self, for_white: bool):
+        '''
+            Everything a player can do now, as a LegalMoves (worked out once per position).
+        '''
+        return legal_moves(for_white, self.board, self.white_pieces, self.black_pieces)
+
     def eval_board(self, for_white: bool):
 
         '''
@@ -496,7 +602,7 @@ class Dame:
             Return False if the player has possible moves.
         '''
 
-        moves = self.list_valid_moves(for_white)
+        moves = self.legal_moves(for_white)
 
         if len(moves) == 0:
             if verbose:
@@ -504,7 +610,7 @@ class Dame:
             return True
 
         elif verbose:
-                print(f"{name[for_white]} has a move: {moves[0]}, so the game is still going.")
+                print(f"{name[for_white]} has a move: {moves.turns[0].path[:2]}, so the game is still going.")
         return False
 
     def play_vs_man(self):
@@ -533,15 +639,21 @@ class Dame:
                 self.print_board()
                 print(f"{name[not for_white]} has Won! The Game! Wow! Good job!")
 
-    def play_vs_ai(self, team: bool, IQ:int):
+    def play_vs_ai(self, team: bool, IQ:int = None, time_limit:float = None):
         '''
             Play against a fully sentient, conscious artificial intelligence.
-            You are playing on the team team, agiant an AI with an IQ of IQ.
+            You are playing on the team team, agiant an AI with an IQ of IQ,
+            or one that thinks for time_limit milliseconds per move.
         '''
 
-        robot = dai.Dame_AI(self, is_white = False) #TODO: choose player
+        import dame_ai as dai # Not needed before there's a robot to play against
+        import openingbook
+        import tablebase
 
-        for_white = team
+        robot = dai.Dame_AI(self, is_white = not team, book = openingbook.default_book(),
+                            tablebase = tablebase.default_tablebase())
+
+        for_white = True # White always opens
         your_turn = team
         running = True
 
@@ -551,14 +663,15 @@ class Dame:
 
             # Players and robots do things alike.
             
-            # Human turn
+            # Human turn, the robot thinks ahead meanwhile
             if your_turn:
+                robot.ponder(IQ)
                 if self.take_turn(for_white) == -1:
                     running = False
 
             # Robot turn
             else:
-                robot.take_turn(depth = IQ, verbose=True)
+                robot.take_turn(depth = IQ, verbose=True, time_limit = time_limit)
 
             for_white = not for_white
             your_turn = not your_turn
@@ -570,11 +683,15 @@ class Dame:
                 self.print_board()
                 print(f"{name[not for_white]} has Won! The Game! Wow! Good job!")
 
+        robot.stop_pondering()
+
     def play(self):
         '''
             Pick and choose a way to play dame
         '''
 
+        from mainmenu import MainMenu # Only the console game has a menu
+
         menu = MainMenu()
         command = menu.get_command()
 
@@ -584,8 +701,8 @@ class Dame:
                 self.play_vs_man()
 
             case 1: # VS AI
-                team, IQ = menu.setup_vs_ai()
-                self.play_vs_ai(team, IQ)
+                team, IQ, time_limit = menu.setup_vs_ai()
+                self.play_vs_ai(team, IQ, time_limit)
 
             case 2: # QUIT
                 print("Bye!")
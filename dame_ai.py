@@ -1,26 +1,253 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, TimeoutError, wait
+
 import dame as dm
 import numpy as np
 
-class Dame_AI:
+import engine
+from engine import bitboard as bb
+from engine import transposition as tt
+from engine.search import MAX_DEPTH, QUIESCENCE_NODES, OutOfTime
+import tablebase as tb
+
+
+# How often (in seconds) a parallel search waiting on its workers checks if it was stopped
+STOP_POLL = 0.05
+
+
+class SearchStats:
+    '''
+        What the robot's searches did during a turn, one record (a dict) per search in self.searches:
+
+            depth, finished:      how deep it looked, and if it got to the end before the time ran out
+            seconds, nodes, nps:  how long it took, how many positions it visited, and how many per second
+            leaf_evals:           positions at the end of the search's lines (scored by quiescence or eval_board)
+            quiescence_nodes:     positions the quiescence search went through past them
+            movegen_calls:        positions whose moves were listed
+            branching:            positions visited per position whose moves were listed (how bushy the tree was)
+            growth:               nodes compared to the search one depth shallower (the effective branching factor)
+            cutoffs, cutoff_rate: positions where a move was good enough to stop looking at the rest, and their share
+                                  of the positions whose moves were listed
+            table_cutoffs:        positions the transposition table had the answer for
+            tablebase_hits:       positions the endgame tablebase had the answer for
+            table_hits, table_probes, table_hit_rate: how often a position was found in the table at all
+            worker_nodes:         the nodes that were visited by the worker processes of a parallel search
+
+        With a parallel search, the nodes of the worker processes are counted, everything else only in the robot's own process.
+        So when the workers did some of the search, branching and cutoff_rate are None: the moves the workers listed
+        and the cutoffs they found aren't counted, dividing by the robot's own would make no sense.
+    '''
+
+    COUNTERS = ('leaf_evals', 'quiescence_nodes', 'movegen_calls', 'cutoffs', 'table_cutoffs', 'tablebase_hits',
+                'worker_nodes')
+
+    def __init__(self):
+        self.searches = []
+        self.reset()
+
+    def reset(self):
+        '''
+            Forgets everything, for a new turn.
+        '''
+        self.searches.clear()
+        for counter in self.COUNTERS:
+            setattr(self, counter, 0)
+        self._started = None
+
+    def begin(self, depth:int, robot):
+        '''
+            A search of the robot starts.
+        '''
+        self._started = (depth, time.perf_counter(), robot.nodes, robot.table.hits, robot.table.misses,
+                         [getattr(self, counter) for counter in self.COUNTERS])
+
+    def end(self, robot, finished:bool = True):
+        '''
+            The search started last ended (or ran out of time, if not finished), writes down its record.
+        '''
+        if self._started is None:
+            return
+        depth, start, nodes, hits, misses, counters = self._started
+        self._started = None
+
+        record = {'depth': depth, 'finished': finished, 'seconds': time.perf_counter() - start,
+                  'nodes': robot.nodes - nodes}
+        for counter, before in zip(self.COUNTERS, counters):
+            record[counter] = getattr(self, counter) - before
+
+        record['table_hits'] = robot.table.hits - hits
+        record['table_probes'] = record['table_hits'] + robot.table.misses - misses
+
+        record['nps'] = record['nodes'] / record['seconds'] if record['seconds'] > 0 else 0.0
+        parallel = record['worker_nodes'] > 0
+        record['branching'] = record['nodes'] / max(1, record['movegen_calls']) if not parallel else None
+        record['cutoff_rate'] = record['cutoffs'] / max(1, record['movegen_calls']) if not parallel else None
+        record['table_hit_rate'] = record['table_hits'] / max(1, record['table_probes'])
+        shallower = [search for search in self.searches if search['depth'] == depth - 1 and search['finished']]
+        record['growth'] = record['nodes'] / max(1, shallower[-1]['nodes']) if shallower and finished else None
+
+        self.searches.append(record)
+
+    def as_dict(self):
+        '''
+            Everything as plain data (fit for json): the records, and their totals.
+        '''
+        totals = {key: sum(search[key] for search in self.searches)
+                  for key in ('seconds', 'nodes', 'table_hits', 'table_probes') + self.COUNTERS}
+        return {'searches': [dict(search) for search in self.searches], 'totals': totals}
+
+    def __str__(self):
+        lines = [f"{'depth':>5} {'seconds':>8} {'nodes':>9} {'nps':>9} {'leaves':>8} {'quiesce':>8} {'movegen':>8} "
+                 f"{'branch':>6} {'growth':>6} {'cutoffs':>7} {'table':>6} {'hits':>5}"]
+        for search in self.searches:
+            growth = f"{search['growth']:6.2f}" if search['growth'] is not None else f"{'-':>6}"
+            branching = f"{search['branching']:6.2f}" if search['branching'] is not None else f"{'-':>6}"
+            cutoff_rate = f"{search['cutoff_rate']:7.1%}" if search['cutoff_rate'] is not None else f"{'-':>7}"
+            lines.append(f"{search['depth']:>5} {search['seconds']:8.3f} {search['nodes']:9d} {search['nps']:9.0f} "
+                         f"{search['leaf_evals']:8d} {search['quiescence_nodes']:8d} {search['movegen_calls']:8d} {branching} {growth} "
+                         f"{cutoff_rate} {search['table_cutoffs']:6d} {search['table_hit_rate']:5.0%}"
+                         + ("" if search['finished'] else "  (ran out of time)"))
+        return "\n".join(lines)
+
+
+
+
+# What a worker process of a parallel search keeps between tasks
+_worker_table = None
+_worker_tablebase = None
+_worker_stopping = None
+_worker_robots = {}
+
+def _start_worker(megabytes:float, replacement:str, tablebase_dir:str = None, stopping = None):
+    '''
+        Gives a fresh worker process its own transposition table, and the robot's tablebase if it has one.
+        stopping is the (multiprocessing) event the robot sets to stop the workers' searches early.
+    '''
+    global _worker_table, _worker_tablebase, _worker_stopping
+    _worker_table = tt.TranspositionTable(megabytes, replacement)
+    _worker_tablebase = tb.Tablebase(tablebase_dir) if tablebase_dir is not None else None
+    _worker_stopping = stopping
+
+def _score_root_move(position:engine.Position, turn:tuple, plies:int, alpha:float, age:int, pv:list,
+                     deadline:float, quiescence:int):
+    '''
+        Runs in a worker process of a parallel search, scores one turn of the robot at the root
+        just like Dame_AI.choose_move would. The score is exact if it is above alpha.
+
+        Returns the score, the best line after the turn and the number of positions searched,
+        or None if the deadline passed or the search was stopped.
+        The robots (one per colour) and the table of the worker stay for the next task.
+    '''
+    is_white = position.white_to_move
+    robot = _worker_robots.get(is_white)
+    if robot is None:
+        robot = _worker_robots[is_white] = Dame_AI(None, is_white, _worker_table, tablebase=_worker_tablebase)
+        if _worker_stopping is not None:
+            robot.stopping = _worker_stopping
+
+    if robot.table.age != age: # A new search started
+        robot.table.age = age
+        robot.history = {key: value//2 for key, value in robot.history.items()}
+
+    robot.killers = [[] for _ in range(plies)]
+    robot.pv, robot.deadline, robot.nodes, robot.quiescence = pv, deadline, 0, quiescence
+
+    key = tt.hash_position(is_white, *position[:4]) ^ tt.turn_key(is_white, *position[:4], turn)
+    child = engine.Position(*bb.play(is_white, *position[:4], *turn), not is_white)
+
+    try:
+        score = -robot.negamax(plies-1, not is_white, -np.inf, -alpha, 1, key, *child[:4],
+                               on_pv = len(pv) > 0 and turn == pv[0])
+    except OutOfTime:
+        return None
+
+    return score, robot.principal_variation(plies-1, child), robot.nodes
+
+class Dame_AI(engine.Search):
     '''
         A robot that plays dame and tries not to lose
+
+        The thinking itself is engine.Search's, done on the bitboards of the game's position.
+        The robot adds the game around it: it plays on the game's board, can take its moves
+        from an opening book, share the root moves out among worker processes, and think on the enemy's time.
     '''
 
-    def __init__(self, game:dm.Dame, is_white:bool):
+    def __init__(self, game:dm.Dame, is_white:bool, table:tt.TranspositionTable = None, processes:int = 1,
+                 stats:bool = False, book = None, tablebase:tb.Tablebase = None, quiescence:int = QUIESCENCE_NODES):
         '''
             Links robot to the game
+
+            The robot remembers the positions it searched in a transposition table,
+            a default sized one is made if none is given.
+
+            With more than one process, the moves at the root of the search are shared out
+            among that many worker processes. They are started on the first search and kept
+            until close() is called, every worker has a table as big as the robot's.
+
+            With stats, the searches of every turn are written down in self.stats (a SearchStats).
+            Without it, the search doesn't count anything more than it needs to.
+
+            With a book (an openingbook.OpeningBook), the robot plays the book's move
+            whenever it knows the position, without thinking at all.
+
+            With a tablebase, positions with few enough pieces left aren't searched any further,
+            the search takes the tablebase's exact score for them.
+
+            The lines of the search don't end in the middle of a capture: the captures are played out
+            first, visiting up to quiescence positions per line (see engine.Search.quiesce). 0 turns that off.
+
+            search_in_background thinks in another thread, so the caller can do something else meanwhile.
         '''
+        super().__init__(quiescence, table, tablebase)
 
         self.game = game
         self.is_white = is_white
+        self.processes = processes
+        self.pool = None
+        self.pool_stopping = None # stopping, for the worker processes
+        self.book = book
+
+        # Thinking on the enemy's time: the enemy's move the robot expects, and the search after it
+        self.expected = None
+        self.pondering = None
+        self.background = None # The BackgroundSearch thinking with the robot right now, if there is one
+
+        # Bookkeeping, only if asked for: the counting goes around negamax, which is left alone otherwise
+        self.stats = SearchStats() if stats else None
+        if stats:
+            self.negamax = self.counted_negamax
+
+    def close(self):
+        '''
+            Stops the worker processes of the parallel search, if there are any.
+        '''
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def position_of(self, board:np.array = None, white_pieces:bb.Pieces = None, black_pieces:bb.Pieces = None):
+        '''
+            The engine.Position of the robot to move on a board, the game's board by default.
+        '''
+        if board is None:
+            board = self.game.board
+            white_pieces = self.game.white_pieces
+            black_pieces = self.game.black_pieces
+
+        return engine.Position(*bb.bitboards(board, white_pieces, black_pieces), self.is_white)
 
     def list_valid_moves(self, for_me:bool = True, board:np.array=None,
-                         white_pieces:list=None, black_pieces:list=None):
+                         white_pieces:bb.Pieces=None, black_pieces:bb.Pieces=None):
         '''
             Gives a list of moves the robot can make,
             only includes jumps if the robot can jump.
 
             Or do that for the enemy.
+
+            A move is a whole turn (a dame.Move), with every jump the piece has to make.
+            The moves come from dame.legal_moves, so a position the game just looked at isn't worked out again.
         '''
 
         if board is None:
@@ -30,15 +257,10 @@ class Dame_AI:
 
         for_white = self.is_white if for_me else not self.is_white
 
-        moves = dm.list_valid_moves(for_white, board, white_pieces, black_pieces)
+        return list(dm.legal_moves(for_white, board, white_pieces, black_pieces))
 
-        # Keep only jumps if needed
-        if dm.can_jump(board, white_pieces, black_pieces, for_white):
-            moves = [move for move in moves if abs(move[0][0] - move[1][0]) == 2]
-
-        return moves
-    
-    def choose_move(self, depth:int, board:np.array=None, white_pieces:list=None, black_pieces:list=None):
+    def choose_move(self, depth:int, board:np.array=None, white_pieces:bb.Pieces=None, black_pieces:bb.Pieces=None,
+                    deadline:float = None):
         '''
             Chooses a move somehow.
 
@@ -47,102 +269,401 @@ class Dame_AI:
 
             When depth is more than or equal to 1, uses minmax principles to choose the move that leads to the
             best score down the line assuming you're trying to force a low score for the robot.
+
+            The minmax is engine.Search's negamax with alpha-beta pruning, so branches that can't change
+            the outcome are never looked at. It still picks the very same move as a full minmax
+            would, ties included: the first of the equally good moves in list_valid_moves order,
+            or the first one that leaves the enemy without a move if there is such a move.
+
+            If a deadline (in time.perf_counter() seconds) is given and the search runs past it,
+            OutOfTime is raised.
+
+            The best line of play found is left in self.line.
+        '''
+        self.stopping = threading.Event()
+        return self.search(self.position_of(board, white_pieces, black_pieces), depth, deadline)
+
+    def search(self, position:engine.Position, depth:int, deadline:float = None):
+        '''
+            engine.Search.search, written down in self.stats if the robot keeps stats.
+        '''
+        if self.stats is None:
+            return super().search(position, depth, deadline)
+
+        self.stats.begin(depth, self)
+        try:
+            found = super().search(position, depth, deadline)
+        except OutOfTime:
+            self.stats.end(self, finished = False)
+            raise
+        self.stats.end(self)
+        return found
+
+    def search_root(self, ordered:list, plies:int, key:int, position:engine.Position):
+        '''
+            engine.Search.search_root, shared out among the worker processes if the robot has more than one.
+        '''
+        if self.processes > 1 and plies > 1 and len(ordered) > 1:
+            return self.split_root(ordered, plies, position)
+        return super().search_root(ordered, plies, key, position)
+
+    def split_root(self, ordered:list, plies:int, position:engine.Position):
+        '''
+            The parallel version of search_root, ordered has the (index, turn) pairs
+            in the order they should be looked at. Returns the index of the best move, its score and line.
+
+            The first move is scored in full first. Every other move is then only asked whether it
+            beats that (or equals it, if it comes earlier in the list), all at the same time in the workers.
+            A move that does is scored exactly, so the winner is the same as in the serial search.
+        '''
+
+        if self.pool is None:
+            self.pool_stopping = multiprocessing.Event()
+            self.pool = ProcessPoolExecutor(self.processes, initializer=_start_worker,
+                                            initargs=(self.table.megabytes, self.table.replacement,
+                                                      self.tablebase.directory if self.tablebase is not None else None,
+                                                      self.pool_stopping))
+
+        def submit(turn, alpha):
+            pv = self.pv if self.pv and turn == self.pv[0] else []
+            return self.pool.submit(_score_root_move, position, turn, plies, alpha, self.table.age, pv,
+                                    self.deadline, self.quiescence)
+
+        first_idx, first = ordered[0]
+        task = submit(first, -np.inf)
+        first_score, first_line, nodes = self.collect(task, [task])
+        self.count_worker_nodes(nodes)
+        tasks = []
+        for idx, turn in ordered[1:]:
+            alpha = self.root_alpha(first_score, idx, first_idx)
+            tasks.append((idx, turn, alpha, submit(turn, alpha)))
+
+        best_idx, best_score, best_line = first_idx, first_score, [first] + first_line
+        for idx, turn, alpha, task in tasks:
+
+            score, line, nodes = self.collect(task, [rest for *_, rest in tasks])
+            self.count_worker_nodes(nodes)
+            exact = score > alpha or alpha == -np.inf
+            if exact and (score > best_score or (score == best_score and idx < best_idx)):
+                best_idx, best_score, best_line = idx, score, [turn] + line
+
+        return best_idx, best_score, best_line
+
+    def count_worker_nodes(self, nodes:int):
+        '''
+            Adds the positions a worker process visited to the robot's, and to its stats if it keeps them.
+        '''
+        self.nodes += nodes
+        if self.stats is not None:
+            self.stats.worker_nodes += nodes
+
+    def collect(self, task, tasks:list):
         '''
+            Waits for the result of a worker's task in a parallel search. If the time ran out
+            or the search was stopped, stops all the tasks (futures) of the search and raises OutOfTime.
+        '''
+        found = None
+        while not self.stopping.is_set():
+            try:
+                found = task.result(timeout = STOP_POLL)
+                break
+            except TimeoutError:
+                pass
+
+        if found is None:
+            for rest in tasks:
+                rest.cancel()
+            self.pool_stopping.set() # The ones already running only give up if told to
+            wait(tasks)
+            self.pool_stopping.clear()
+            raise OutOfTime
+
+        return found
+
+    def counted_negamax(self, plies:int, for_white:bool, alpha:float, beta:float, ply:int, key:int,
+                        wm:int, bm:int, wk:int, bk:int, on_pv:bool = False):
+        '''
+            negamax, but writing down what it did in self.stats. Takes the place of negamax when the robot keeps stats,
+            so the children are counted too.
+        '''
+        stats = self.stats
+
+        # Would the table answer right away? (Looked at without touching its counters)
+        entry = self.table.peek(key, for_white)
+        if entry is not None:
+            depth, kind, score, _ = entry
+            if depth == plies and (kind == tt.EXACT or
+                                   (kind == tt.LOWER and score >= beta) or
+                                   (kind == tt.UPPER and score <= alpha)):
+                stats.table_cutoffs += 1
+                return engine.Search.negamax(self, plies, for_white, alpha, beta, ply, key, wm, bm, wk, bk, on_pv)
+
+        if self.tablebase is not None and (wm | bm | wk | bk).bit_count() <= self.tablebase.pieces and \
+                self.tablebase.probe_bitboards(for_white, wm, bm, wk, bk) is not None:
+            stats.tablebase_hits += 1
+        elif plies == 0:
+            stats.leaf_evals += 1
+        else:
+            stats.movegen_calls += 1
 
+        nodes = self.nodes
+        score = engine.Search.negamax(self, plies, for_white, alpha, beta, ply, key, wm, bm, wk, bk, on_pv)
+
+        if plies == 0:
+            stats.quiescence_nodes += self.nodes - nodes - 1
+        if plies > 0 and score >= beta:
+            stats.cutoffs += 1
+        return score
+
+    def think(self, time_limit:float, max_depth:int = MAX_DEPTH, deadline:float = None, board:np.array = None,
+              white_pieces:bb.Pieces = None, black_pieces:bb.Pieces = None, on_progress = None,
+              stopping:threading.Event = None):
+        '''
+            Iterative deepening on the game's board (or the board given), see engine.Search.think:
+            returns the (move, score, depth) of the deepest search that could finish in time_limit milliseconds.
+        '''
+        return super().think(self.position_of(board, white_pieces, black_pieces), time_limit, max_depth, deadline,
+                             on_progress, stopping)
+
+    def search_in_background(self, time_limit:float = None, max_depth:int = MAX_DEPTH, on_progress = None,
+                             board:np.array = None, white_pieces:bb.Pieces = None, black_pieces:bb.Pieces = None):
+        '''
+            Starts a think on the game's board as it is now (or on the board given), in another thread,
+            and returns its BackgroundSearch right away. Without a time limit it thinks until it's stopped
+            (or reaches max_depth). The robot mustn't be used for anything else until the search is done,
+            starting another search in the background before then raises RuntimeError.
+        '''
         if board is None:
             board = self.game.board
             white_pieces = self.game.white_pieces
             black_pieces = self.game.black_pieces
 
-        moves = self.list_valid_moves(True, board, white_pieces, black_pieces)
-        if len(moves) == 0: # The robot is losing here. sad.
-            return None, -np.inf
-        hygames = []
-        
-        for fro, to in moves:
-
-            # Hypothetic game for each move robot could make
-            hygame = [board.copy(), list(white_pieces), list(black_pieces)]
-            dm.move(hygame[0], hygame[1], hygame[2], fro, to, self.is_white)
-            hygames.append(hygame)
-
-        # At this point, hygames contains a boardstate for every move available now.
-
-        if depth == 0: # No depth, just give the best move now
-            best_idx = max(range(len(hygames)), key = lambda idx: 
-                           dm.eval_board(hygames[idx][0], hygames[idx][1], hygames[idx][2], self.is_white))
-            best_score = dm.eval_board(hygames[best_idx][0], hygames[best_idx][1],
-                                       hygames[best_idx][2], self.is_white)
-            return moves[best_idx], best_score
-        
-        else:
-            potential_scores = [] # Gather the possible scorethe robot can end up with for each move the
-                                  # Enemy (you) could make
-            for gameno, hygame in enumerate(hygames):
+        return BackgroundSearch(self, time_limit, max_depth, on_progress, board, white_pieces, black_pieces)
+
+    async def choose_move_async(self, time_limit:float = None, max_depth:int = MAX_DEPTH, on_progress = None):
+        '''
+            search_in_background for asyncio: awaits the (move, score, depth) without blocking the event loop.
+            Cancelling the awaiting task stops the search.
+        '''
+        import asyncio # Only the callers that run an event loop have it loaded already
+
+        search = self.search_in_background(time_limit, max_depth, on_progress)
+        try:
+            return await asyncio.wrap_future(search.future)
+        except asyncio.CancelledError:
+            search.cancel()
+            # The thread only gives up the next time it looks at the clock, the robot isn't free before that
+            await asyncio.get_running_loop().run_in_executor(None, search.thread.join)
+            raise
+
+    def ponder(self, depth:int = None):
+        '''
+            Thinks on the enemy's time: guesses the enemy's move (the answer in the robot's last best line,
+            or the best move the table knows), and starts a search in the background on the board after it.
+            Use it right when the enemy's turn starts, with the depth the robot will take its turn with
+            (None if it plays on time). The next take_turn picks the search up, or stop_pondering() ends it.
+            Returns the move it expects, or None if it has no guess.
+        '''
+        self.stop_pondering()
+        board, white_pieces, black_pieces = self.game.board, self.game.white_pieces, self.game.black_pieces
 
-                player_moves = self.list_valid_moves(False, hygame[0], hygame[1], hygame[2])
-                player_games = []
-                you_scores = []
+        expected = self.expected
+        if expected is None:
+            entry = self.table.peek(tt.hash_board(board, not self.is_white), not self.is_white)
+            expected = engine.move_of(entry[3]) if entry is not None and entry[3] is not None else None
 
-                if len(player_moves) == 0: # The player loses if the robot picks this move
-                    return moves[gameno], np.inf
+        if expected not in self.list_valid_moves(False):
+            return None
 
-                # The hypothetical you examines all moves they can make
-                for pfro, pto in player_moves:
-                    player_game = [hygame[0].copy(), list(hygame[1]), list(hygame[2])]
-                    dm.move(player_game[0], player_game[1], player_game[2], pfro, pto, not self.is_white)
-                    player_games.append(player_game)
+        hyboard, hywhite, hyblack = dm.BoardState(board, white_pieces, black_pieces).copy()
+        dm.make_turn(hyboard, hywhite, hyblack, expected, not self.is_white)
+        if not self.list_valid_moves(True, hyboard, hywhite, hyblack):
+            return None
 
-                # robot picks a best move for every move you could make, tells the score this leads to. 
-                for player_game in player_games:
+        search = self.search_in_background(None, depth if depth is not None else MAX_DEPTH,
+                                           board=hyboard, white_pieces=hywhite, black_pieces=hyblack)
+        self.pondering = hyboard, search
+        return expected
 
-                    # You get a bit dumber for the sake of finite runtime
-                    _, best_score = self.choose_move(depth-1, player_game[0], 
-                                                        player_game[1], player_game[2])
-                    you_scores.append(best_score)
+    def stop_pondering(self):
+        '''
+            Ends the search started by ponder, if there is one. What it put in the table stays.
+        '''
+        if self.pondering is not None:
+            _, search = self.pondering
+            self.pondering = None
+            search.cancel()
+            search.thread.join()
 
-                # The enemy will pick a move that makes you end up with the least possible score in the end
-                player_favorite_score = min(you_scores)
-                potential_scores.append(player_favorite_score)
+    def ponder_answer(self, depth:int = None, time_limit:float = None):
+        '''
+            The move the pondering found, if the enemy played the move the robot expected, or None.
 
-            # Pick the move that makes the enemy's favorite score the highest
-            best_idx = max(range(len(potential_scores)), key=lambda idx: potential_scores[idx])
-            return moves[best_idx], potential_scores[best_idx]
-    
-    def take_turn(self, depth:int, verbose:bool = False):
+            The pondering search goes on until it's depth moves deep, or until time_limit milliseconds
+            after it started, so the robot answers right away if the enemy took long enough.
+        '''
+        if self.pondering is None:
+            return None
+        board, search = self.pondering
+
+        if not np.array_equal(board, self.game.board):
+            self.stop_pondering()
+            return None
+        self.pondering = None
+
+        if depth is None:
+            try:
+                search.result(timeout = max(0, search.started + time_limit / 1000 - time.perf_counter()))
+            except TimeoutError:
+                search.stop()
+        result = search.result()
+
+        return result[0] if result is not None else None
+
+    def take_turn(self, depth:int = None, verbose:bool = False, time_limit:float = None):
         '''
             The robot takes its turn at the game
+
+            It either looks depth moves ahead, or keeps thinking deeper
+            until time_limit milliseconds run out. Returns the turn it took.
+            If the opening book knows the position, it just plays the book move.
+            If it was pondering (see ponder) and guessed the enemy's move right, it goes on from there.
         '''
-        
+
+        if (depth is None) == (time_limit is None):
+            raise ValueError("The robot needs either a depth or a time limit, not both.")
+
         if verbose:
-            print(f"The robot is thinking{depth * ' really'}{' hard'*int(depth>0)}...")
+            if depth is not None:
+                print(f"The robot is thinking{depth * ' really'}{' hard'*int(depth>0)}...")
+            else:
+                print(f"The robot is thinking for {time_limit:g} milliseconds...")
+
+        self.nodes = 0
+        if self.stats is not None:
+            self.stats.reset()
+
+        move = None
+        if self.book is not None:
+            move = self.book.choose(self.game.board, self.game.white_pieces, self.game.black_pieces, self.is_white)
+            if move is not None and verbose:
+                print("The robot knows this one by heart.")
+
+        if move is None:
+            move = self.ponder_answer(depth, time_limit)
+            if move is not None and verbose:
+                print("The robot saw that one coming.")
+        else:
+            self.stop_pondering()
+
+        if move is None and depth is not None:
+            move, _ = self.choose_move(depth)
+        elif move is None:
+            move, _, reached = self.think(time_limit)
+            if verbose:
+                print(f"The robot looked {reached} moves ahead.")
+
+        if verbose and self.stats is not None:
+            print(self.stats)
 
-        turn_done = False
-        while not turn_done: 
+        # The enemy's answer the robot is counting on, for pondering
+        self.expected = self.line[1] if len(self.line) > 1 and self.line[0] == move else None
 
-            (fro, to), _ = self.choose_move(depth)
+        # The whole turn is known already, jumps and all
+        path = move.path
+        for i in range(len(path) - 1):
 
+            fro, to = path[i], path[i+1]
             if verbose:
                 print(f"{dm.name[self.is_white]}, the robot moves from {self.game.col_to_char[fro[0]] + str(8-fro[1])} to {self.game.col_to_char[to[0]] + str(8-to[1])}.")
 
-            turn_done = not self.game.move(fro, to, self.is_white, verbose) # Stays as True if you jump
+            jumped = self.game.move(fro, to, self.is_white, verbose)
 
-            if not turn_done:
+            if jumped and verbose:
+                keep_going = i < len(path) - 2
+                if keep_going:
+                    self.game.print_board()
+                    print("The robot is hyperventilating.")
+                print(f"It't a clean kill!{int(keep_going) * ' keep going, robot!'}")
 
-                # Check to see if the jumping piece can jump again
-                turn_done = True
+        return move
 
-                for (xf,yf), (xto,_) in self.list_valid_moves():
 
-                    # We found the jumper, can he jump again?
-                    if (xf,yf) == to and abs(xf-xto) == 2:
-                        turn_done = False
-                        
-                        if verbose:
-                            self.game.print_board()
-                            print("The robot is hyperventilating.")
+class BackgroundSearch:
+    '''
+        A robot's think running in its own thread (see Dame_AI.search_in_background).
+
+        self.future gets the (move, score, depth) of the think when it's done. While it runs,
+        self.depth, self.move, self.score and self.line are the deepest finished step so far
+        (depth is None before depth 0 is done), and self.searching is the depth it's working on now.
+        self.started is when it started, in time.perf_counter() seconds.
 
-                        break # No need to keep checking
+        stop() makes it finish early with the best move so far, cancel() makes it finish
+        without one (the future is cancelled).
+    '''
 
-                if verbose:
-                    print(f"It't a clean kill!{int(not turn_done) * ' keep going, robot!'}")
\ No newline at end of file
+    def __init__(self, robot:Dame_AI, time_limit:float, max_depth:int, on_progress,
+                 board:np.array, white_pieces:bb.Pieces, black_pieces:bb.Pieces):
+        if robot.background is not None:
+            raise RuntimeError("The robot is still thinking about something else, stop or cancel that first.")
+        robot.background = self
+
+        self.robot = robot
+        self.future = Future()
+        self.on_progress = on_progress
+        self.depth, self.move, self.score, self.line = None, None, None, []
+        self.searching = 0
+        self.started = time.perf_counter()
+
+        # The search gets a board of its own, the game can go on meanwhile
+        self.position = dm.BoardState(board, white_pieces, black_pieces).copy()
+
+        # An event for this search only, so a late stop() can't stop the next one
+        self.stopping = threading.Event()
+
+        self.thread = threading.Thread(target=self.run, args=(time_limit, max_depth), daemon=True)
+        self.thread.start()
+
+    def run(self, time_limit:float, max_depth:int):
+        try:
+            result = self.robot.think(time_limit, max_depth, None, *self.position, on_progress=self.progress,
+                                      stopping=self.stopping)
+        except BaseException as error:
+            self.finish(self.future.set_exception, error)
+        else:
+            self.finish(self.future.set_result, result)
+
+    def finish(self, settle, outcome):
+        self.robot.background = None # Ready for the robot's next search
+        try:
+            settle(outcome)
+        except InvalidStateError: # It was cancelled
+            pass
+
+    def progress(self, depth:int, move:dm.Move, score:float, line:list):
+        self.depth, self.move, self.score, self.line = depth, move, score, line
+        self.searching = depth + 1
+        if self.on_progress is not None:
+            self.on_progress(depth, move, score, line)
+
+    def stop(self):
+        '''
+            Makes the search finish as soon as it can, its future then gets the deepest move it finished.
+        '''
+        self.stopping.set()
+
+    def cancel(self):
+        '''
+            Stops the search and throws away what it found.
+        '''
+        self.future.cancel()
+        self.stopping.set()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout:float = None):
+        '''
+            Waits for the search to finish, returns its (move, score, depth).
+        '''
+        return self.future.result(timeout)
@@ -0,0 +1,23 @@
+'''
+    The engine on its own: positions, the rules and the robot's search, without the console game.
+
+    It's meant for what only needs to know the moves, like worker processes and short command line calls,
+    so it loads quickly: nothing here needs NumPy (only Position.board() does, and loads it then),
+    and the menus, the game and the robot's other helpers (book, tablebase, worker pool) aren't loaded at all.
+    The rules are the bitboard move generation of bitboard.py, the scores those of evaluation.py,
+    and the search (search.py, which dame_ai.Dame_AI builds on) remembers positions in transposition.py's table.
+    The game and everything else import these from here, never the other way around.
+
+        import engine
+
+        position = engine.Position.read("W:Wc3,e3:Bd6,f6")
+        move, score = engine.Search().choose_move(position, 3)
+        position = position.play(move)
+
+    or from the command line (python importbench.py checks that this keeps loading fast):
+
+        python -m engine "W:Wc3,e3:Bd6,f6" --depth 3
+'''
+
+from .position import Move, Position, mirror_move, move_of, turn_of, square_name, turn_name
+from .search import Search, evaluate, OutOfTime, MAX_DEPTH, QUIESCENCE_NODES, WIN
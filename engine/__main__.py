@@ -0,0 +1,46 @@
+'''
+    The robot's move in a position, without starting the game:
+
+        python -m engine "W:Wc3,e3:Bd6,f6" --depth 3
+        python -m engine "B:Wc3,e3:Bd6,f6" --time 250
+'''
+
+import argparse
+import time
+
+from . import Position, Search, turn_name, QUIESCENCE_NODES
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog="python -m engine", description="Find the robot's move in a position.")
+    parser.add_argument('position', nargs='?', default=None, help="like W:Wc3,e3:Bd6,f6 (the starting position if left out)")
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument('--depth', type=int, default=None, help="turns of both players to look ahead")
+    limit.add_argument('--time', type=float, default=None, help="milliseconds to think")
+    parser.add_argument('--quiescence', type=int, default=QUIESCENCE_NODES)
+    args = parser.parse_args(argv)
+
+    try:
+        position = Position.read(args.position) if args.position is not None else Position.start()
+    except ValueError as error:
+        parser.error(str(error))
+
+    search = Search(args.quiescence)
+    start = time.perf_counter()
+    if args.time is not None:
+        move, score, depth = search.think(position, args.time)
+    else:
+        depth = args.depth if args.depth is not None else 3
+        move, score = search.choose_move(position, depth)
+    ms = (time.perf_counter() - start) * 1000
+
+    if move is None:
+        print(f"{'White' if position.white_to_move else 'Black'} has no move.")
+        return
+
+    print(f"{turn_name(move)}  score {score}  depth {depth}  {search.nodes} positions  {ms:.0f} ms")
+    print(position.play(move))
+
+
+if __name__ == "__main__":
+    main()
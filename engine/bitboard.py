@@ -0,0 +1,586 @@
+'''
+    Bitboard backend for the move generation.
+
+    Only the 32 dark squares of the board can ever hold a piece, so a position fits into
+    four 32 bit integers: white men, black men, white kings and black kings.
+    Square number s belongs to the board index (x, y) with s = 4*y + x//2,
+    so every row of the board is 4 consecutive bits.
+
+    With this layout a step along a diagonal is a shift by 3, 4 or 5 depending on the
+    parity of the row, and a jump is always a shift by 7 or 9. Every piece of a colour
+    can then be stepped (or jumped) in one direction with a single shift-and-mask,
+    instead of looking at the squares one at a time.
+'''
+
+from itertools import product
+
+
+# Board index of every square, and the other way around (None for the light squares)
+SQUARES = [(2*(s % 4) + 1 - (s//4) % 2, s//4) for s in range(32)]
+SQUARE_OF = [[None]*8 for _ in range(8)]
+for _s, (_x, _y) in enumerate(SQUARES):
+    SQUARE_OF[_x][_y] = _s
+
+# Position of every square in board.ravel() (the board is indexed as board[x,y])
+FLAT = [8*x + y for x, y in SQUARES]
+
+FULL = (1 << 32) - 1
+EVEN_ROWS = sum(1 << s for s in range(32) if (s//4) % 2 == 0)
+ODD_ROWS = FULL ^ EVEN_ROWS
+
+
+def _on_board(x, y):
+    return 0 <= x < 8 and 0 <= y < 8
+
+
+def _shift(mask: int, by: int):
+    '''
+        Shifts a mask towards the higher squares if by is positive, towards the lower ones otherwise.
+    '''
+    return (mask << by) & FULL if by > 0 else mask >> -by
+
+
+def _step_table(dx: int, dy: int):
+    '''
+        The (mask, shift) pairs that step every piece of a row parity one square in direction (dx, dy).
+        The mask only keeps the squares whose neighbour in that direction is still on the board.
+    '''
+    table = []
+    for rows in (EVEN_ROWS, ODD_ROWS):
+        mask, by = 0, None
+        for s in range(32):
+            x, y = SQUARES[s]
+            if (1 << s) & rows and _on_board(x+dx, y+dy):
+                mask |= 1 << s
+                by = SQUARE_OF[x+dx][y+dy] - s
+        table.append((mask, by))
+    return tuple(table)
+
+
+# Directions in the order the pieces check them: forward ones first, backward (kings only) after.
+FORWARD = {
+    True: list(product([-1, 1], [-1])),  # White goes up
+    False: list(product([-1, 1], [1]))   # Black goes down
+}
+BACKWARD = {
+    True: FORWARD[False],
+    False: FORWARD[True]
+}
+
+STEP = {d: _step_table(*d) for d in FORWARD[True] + FORWARD[False]}
+JUMP = {(dx, dy): 8*dy + dx for dx, dy in STEP}  # Two rows and one column of bits
+
+# The rows where men get promoted, for each colour
+PROMOTION = {
+    True: sum(1 << s for s in range(4)),
+    False: sum(1 << s for s in range(28, 32))
+}
+
+# For every square and direction the (jumped over square, landing square) pair, None if it falls off the board
+OVER_AND_LAND = [
+    {(dx, dy): (SQUARE_OF[x+dx][y+dy], SQUARE_OF[x+2*dx][y+2*dy]) if _on_board(x+2*dx, y+2*dy) else None
+     for dx, dy in STEP}
+    for x, y in SQUARES
+]
+
+
+def squares(mask: int):
+    '''
+        Lists the squares of the set bits of a mask, lowest first.
+    '''
+    found = []
+    while mask:
+        low = mask & -mask
+        found.append(low.bit_length() - 1)
+        mask ^= low
+    return found
+
+
+def step(mask: int, direction: tuple):
+    '''
+        Moves every square of a mask one square in a direction, dropping what falls off the board.
+    '''
+    (even_mask, even_by), (odd_mask, odd_by) = STEP[direction]
+    return _shift(mask & even_mask, even_by) | _shift(mask & odd_mask, odd_by)
+
+
+def from_board(board):
+    '''
+        Turns an 8x8 board into the (white men, black men, white kings, black kings) bitboards.
+    '''
+    flat = board.ravel().tolist()
+    wm = bm = wk = bk = 0
+    for s, i in enumerate(FLAT):
+        piece = flat[i]
+        if piece == 1:
+            wm |= 1 << s
+        elif piece == 2:
+            bm |= 1 << s
+        elif piece == 3:
+            wk |= 1 << s
+        elif piece == 4:
+            bk |= 1 << s
+    return wm, bm, wk, bk
+
+
+def to_board(wm: int, bm: int, wk: int, bk: int):
+    '''
+        Turns bitboards back into an 8x8 board.
+    '''
+    import numpy as np
+
+    board = np.zeros([8, 8], dtype=int)
+    for code, mask in enumerate((wm, bm, wk, bk), start=1):
+        for s in squares(mask):
+            board[SQUARES[s]] = code
+    return board
+
+
+class Pieces:
+    '''
+        The pieces of one player, as two bitsets of squares: one of the men, one of the super pieces (kings).
+        Looking for, adding and removing a piece takes the same short time however many pieces there are.
+
+        It goes through its squares as (x, y) board indices, lowest square first,
+        so it can be used wherever a list of squares would be.
+    '''
+
+    __slots__ = ('men', 'kings')
+
+    def __init__(self, men: int = 0, kings: int = 0):
+        self.men = men
+        self.kings = kings
+
+    @classmethod
+    def of(cls, board, for_white: bool):
+        '''
+            The pieces of a player on an 8x8 board.
+        '''
+        wm, bm, wk, bk = from_board(board)
+        return cls(wm, wk) if for_white else cls(bm, bk)
+
+    def __contains__(self, square: tuple):
+        x, y = square
+        s = SQUARE_OF[x][y] if 0 <= x < 8 and 0 <= y < 8 else None
+        return s is not None and ((self.men | self.kings) >> s) & 1 == 1
+
+    def __len__(self):
+        return (self.men | self.kings).bit_count()
+
+    def __iter__(self):
+        return (SQUARES[s] for s in squares(self.men | self.kings))
+
+    def __eq__(self, other):
+        return isinstance(other, Pieces) and self.men == other.men and self.kings == other.kings
+
+    def __repr__(self):
+        return f"Pieces({list(self)})"
+
+    def add(self, square: tuple, king: bool = False):
+        '''
+            Puts a piece (a man, or a super piece if king) on a square.
+        '''
+        bit = 1 << SQUARE_OF[square[0]][square[1]]
+        if king:
+            self.kings |= bit
+        else:
+            self.men |= bit
+
+    def remove(self, square: tuple):
+        '''
+            Takes the piece off a square, raises ValueError if there's none.
+        '''
+        s = SQUARE_OF[square[0]][square[1]]
+        bit = 1 << s if s is not None else 0
+        if self.men & bit:
+            self.men ^= bit
+        elif self.kings & bit:
+            self.kings ^= bit
+        else:
+            raise ValueError(f"No piece on {square}")
+
+    def move(self, fro: tuple, to: tuple, king: bool = False):
+        '''
+            Moves the piece on fro (there has to be one) to to, where it's a super piece if king.
+        '''
+        fro_bit = 1 << SQUARE_OF[fro[0]][fro[1]]
+        self.men &= ~fro_bit
+        self.kings &= ~fro_bit
+        if king:
+            self.kings |= 1 << SQUARE_OF[to[0]][to[1]]
+        else:
+            self.men |= 1 << SQUARE_OF[to[0]][to[1]]
+
+    def copy(self):
+        return Pieces(self.men, self.kings)
+
+
+def bitboards(board, white_pieces, black_pieces):
+    '''
+        The (white men, black men, white kings, black kings) bitboards of a position:
+        straight from the pieces if they are Pieces, from the board otherwise.
+    '''
+    if type(white_pieces) is Pieces and type(black_pieces) is Pieces:
+        return white_pieces.men, black_pieces.men, white_pieces.kings, black_pieces.kings
+    return from_board(board)
+
+
+def _sides(for_white: bool, wm: int, bm: int, wk: int, bk: int):
+    '''
+        Men, kings and all enemy pieces of a player.
+    '''
+    if for_white:
+        return wm, wk, bm | bk
+    return bm, bk, wm | wk
+
+
+def jumpers(for_white: bool, wm: int, bm: int, wk: int, bk: int):
+    '''
+        Mask of the pieces of a player that could jump over something right now.
+    '''
+    men, kings, enemy = _sides(for_white, wm, bm, wk, bk)
+    empty = FULL ^ (wm | bm | wk | bk)
+    found = 0
+
+    for direction in FORWARD[for_white]:
+        landing = step(step(men | kings, direction) & enemy, direction) & empty
+        found |= _shift(landing, -JUMP[direction])
+
+    if kings:
+        for direction in BACKWARD[for_white]:
+            landing = step(step(kings, direction) & enemy, direction) & empty
+            found |= _shift(landing, -JUMP[direction])
+
+    return found
+
+
+def can_jump(for_white: bool, wm: int, bm: int, wk: int, bk: int):
+    '''
+        Check if a player can make some sort of a jump.
+    '''
+    return jumpers(for_white, wm, bm, wk, bk) != 0
+
+
+def generate_moves(for_white: bool, wm: int, bm: int, wk: int, bk: int):
+    '''
+        Lists every move a player can make as (from square, to square) pairs.
+        If there is a jump to be made, only the jumps are listed.
+
+        Moves come grouped by direction (forward ones first), lowest target square first.
+    '''
+    men, kings, enemy = _sides(for_white, wm, bm, wk, bk)
+    empty = FULL ^ (wm | bm | wk | bk)
+
+    directions = [(d, men | kings) for d in FORWARD[for_white]]
+    if kings:
+        directions += [(d, kings) for d in BACKWARD[for_white]]
+
+    # Jumps first, the steps only matter if there are none
+    moves = []
+    for direction, movers in directions:
+        by = JUMP[direction]
+        landing = step(step(movers, direction) & enemy, direction) & empty
+        while landing:
+            low = landing & -landing
+            to = low.bit_length() - 1
+            moves.append((to - by, to))
+            landing ^= low
+
+    if moves:
+        return moves
+
+    for direction, movers in directions:
+        (even_mask, even_by), (odd_mask, odd_by) = STEP[direction]
+        if even_by > 0:
+            landing = (((movers & even_mask) << even_by) | ((movers & odd_mask) << odd_by)) & empty
+        else:
+            landing = (((movers & even_mask) >> -even_by) | ((movers & odd_mask) >> -odd_by)) & empty
+
+        # The row of the target square tells which shift brought the piece there
+        while landing:
+            low = landing & -landing
+            to = low.bit_length() - 1
+            moves.append((to - (odd_by if low & EVEN_ROWS else even_by), to))
+            landing ^= low
+
+    return moves
+
+
+def _capture_paths(for_white: bool, at: int, king: bool, enemy: int, empty: int):
+    '''
+        Every way the piece on square 'at' can keep on jumping, as (squares landed on, squares jumped over, promoted) triples.
+        The jumped over pieces are gone right away, so nothing can be jumped twice.
+        A man that gets promoted halfway keeps on jumping as a king.
+    '''
+    directions = FORWARD[for_white] + BACKWARD[for_white] if king else FORWARD[for_white]
+    paths = []
+
+    for direction in directions:
+        jump = OVER_AND_LAND[at][direction]
+        if jump is None:
+            continue
+
+        over, land = jump
+        if not (enemy >> over) & 1 or not (empty >> land) & 1:
+            continue
+
+        promoted = not king and (PROMOTION[for_white] >> land) & 1 == 1
+        rest = _capture_paths(for_white, land, king or promoted, enemy ^ (1 << over),
+                              (empty | (1 << at) | (1 << over)) ^ (1 << land))
+
+        if not rest:
+            paths.append(([land], [over], promoted))
+        for landed, jumped, later_promoted in rest:
+            paths.append(([land] + landed, [over] + jumped, promoted or later_promoted))
+
+    return paths
+
+
+def generate_turns(for_white: bool, wm: int, bm: int, wk: int, bk: int):
+    '''
+        Yields every whole turn a player can take as (path, captured, promotes) triples:
+        the squares the piece goes through (starting square first), the squares it jumped over,
+        and whether it got promoted on the way.
+
+        A jumping piece has to keep on jumping as long as it can, so a turn
+        with a jump in it is always the whole chain of jumps.
+        If there is a jump to be made, only turns with jumps are listed.
+    '''
+    men, kings, enemy = _sides(for_white, wm, bm, wk, bk)
+    empty = FULL ^ (wm | bm | wk | bk)
+    moves = generate_moves(for_white, wm, bm, wk, bk)
+
+    if moves and abs(moves[0][1] - moves[0][0]) not in (7, 9): # Steps
+        for fro, to in moves:
+            yield (fro, to), (), (men >> fro) & 1 == 1 and (PROMOTION[for_white] >> to) & 1 == 1
+        return
+
+    # Jumps are grouped by starting square, the chains are followed from there
+    for fro in sorted(set(fro for fro, _ in moves)):
+        for landed, jumped, promoted in _capture_paths(for_white, fro, (kings >> fro) & 1 == 1,
+                                                        enemy, empty):
+            yield (fro, *landed), tuple(jumped), promoted
+
+
+def play(for_white: bool, wm: int, bm: int, wk: int, bk: int, path: tuple, captured: tuple, promotes: bool):
+    '''
+        Takes a turn from generate_turns on the bitboards, returns the new ones.
+    '''
+    fro, to = 1 << path[0], 1 << path[-1]
+    gone = FULL ^ sum(1 << s for s in captured)
+
+    if for_white:
+        if wm & fro:
+            wm ^= fro
+            if promotes:
+                wk |= to
+            else:
+                wm |= to
+        else:
+            wk = (wk ^ fro) | to
+        return wm, bm & gone, wk, bk & gone
+
+    if bm & fro:
+        bm ^= fro
+        if promotes:
+            bk |= to
+        else:
+            bm |= to
+    else:
+        bk = (bk ^ fro) | to
+    return wm & gone, bm, wk & gone, bk
+
+
+def reverse(mask: int):
+    '''
+        The 32 bits of a mask the other way around.
+    '''
+    mask = ((mask >> 1) & 0x55555555) | ((mask & 0x55555555) << 1)
+    mask = ((mask >> 2) & 0x33333333) | ((mask & 0x33333333) << 2)
+    mask = ((mask >> 4) & 0x0F0F0F0F) | ((mask & 0x0F0F0F0F) << 4)
+    mask = ((mask >> 8) & 0x00FF00FF) | ((mask & 0x00FF00FF) << 8)
+    return ((mask >> 16) | (mask << 16)) & FULL
+
+
+def mirror(wm: int, bm: int, wk: int, bk: int):
+    '''
+        The bitboards of a position turned around (the board rotated half a turn) with the colours swapped.
+        With the other player to move, that's the very same position seen from the other side:
+        square s becomes square 31 - s, which is just the bits of the masks the other way around.
+    '''
+    return reverse(bm), reverse(wm), reverse(bk), reverse(wk)
+
+
+def canonical(for_white: bool, wm: int, bm: int, wk: int, bk: int):
+    '''
+        The bitboards of a position turned (see mirror) so that white is to move, and whether they were turned.
+        A position and its mirror with the other player to move come out the same.
+    '''
+    if for_white:
+        return (wm, bm, wk, bk), False
+    return mirror(wm, bm, wk, bk), True
+
+
+def mirror_turn(turn: tuple):
+    '''
+        A (path, captured, promotes) turn of generate_turns, on the mirrored position.
+    '''
+    path, captured, promotes = turn
+    return tuple(31 - s for s in path), tuple(31 - s for s in captured), promotes
+
+
+def pack_boards(boards):
+    '''
+        Packs an (N, 8, 8) array of boards into an (N, 4) uint32 array of
+        (white men, black men, white kings, black kings) bitboards, 16 bytes a position.
+    '''
+    import numpy as np
+
+    boards = np.asarray(boards)
+    codes = boards.reshape(len(boards), 64)[:, FLAT]
+    bits = codes[:, None, :] == np.arange(1, 5)[None, :, None]
+    return np.packbits(bits, axis=-1, bitorder='little').view('<u4').reshape(len(boards), 4)
+
+
+def unpack_boards(packed):
+    '''
+        Turns an (N, 4) array of packed positions (see pack_boards) back into an (N, 8, 8) array of boards.
+    '''
+    import numpy as np
+
+    packed = np.ascontiguousarray(packed, dtype='<u4')
+    bits = np.unpackbits(packed.view(np.uint8).reshape(len(packed), 4, 4), axis=-1, bitorder='little')
+    boards = np.zeros([len(packed), 64], dtype=int)
+    boards[:, FLAT] = (bits * np.arange(1, 5, dtype=np.uint8)[None, :, None]).sum(axis=1)
+    return boards.reshape(len(packed), 8, 8)
+
+
+def from_boards(boards):
+    '''
+        Turns an (N, 8, 8) array of boards into an (N, 4) array of
+        (white men, black men, white kings, black kings) bitboards.
+    '''
+    import numpy as np
+
+    return pack_boards(boards).astype(np.uint64)
+
+
+def _shift_batch(masks, by: int):
+    '''
+        _shift for a numpy array of masks.
+    '''
+    import numpy as np
+
+    if by > 0:
+        return (masks << np.uint64(by)) & np.uint64(FULL)
+    return masks >> np.uint64(-by)
+
+
+def _step_batch(masks, direction: tuple):
+    '''
+        step for a numpy array of masks.
+    '''
+    import numpy as np
+
+    (even_mask, even_by), (odd_mask, odd_by) = STEP[direction]
+    return (_shift_batch(masks & np.uint64(even_mask), even_by) |
+            _shift_batch(masks & np.uint64(odd_mask), odd_by))
+
+
+def _landings_batch(for_white: bool, wm, bm, wk, bk):
+    '''
+        The squares a player's pieces can jump to and step to, as two (N, 4, 32) bool arrays
+        (board, direction, target square), with the directions in generate_moves order.
+        Also returns the (4, 32) array of how far back the piece was for each direction and target.
+    '''
+    import numpy as np
+
+    men, kings, enemy = _sides(for_white, wm, bm, wk, bk)
+    empty = np.uint64(FULL) ^ (wm | bm | wk | bk)
+    bits = np.arange(32, dtype=np.uint64)
+
+    jumps, steps, back_jump, back_step = [], [], [], []
+    for direction in FORWARD[for_white] + BACKWARD[for_white]:
+        movers = men | kings if direction in FORWARD[for_white] else kings
+
+        landing = _step_batch(_step_batch(movers, direction) & enemy, direction) & empty
+        jumps.append((landing[:, None] >> bits) & np.uint64(1))
+        back_jump.append([JUMP[direction]] * 32)
+
+        landing = _step_batch(movers, direction) & empty
+        steps.append((landing[:, None] >> bits) & np.uint64(1))
+        (_, even_by), (_, odd_by) = STEP[direction]
+        back_step.append([odd_by if (s//4) % 2 == 0 else even_by for s in range(32)])
+
+    return (np.stack(jumps, axis=1).astype(bool), np.stack(steps, axis=1).astype(bool),
+            np.array(back_jump), np.array(back_step))
+
+
+def generate_moves_batch(for_white, positions):
+    '''
+        generate_moves for many positions at once.
+
+        positions is either an (N, 8, 8) array of boards or an (N, 4) array of bitboards
+        (as from_boards makes them), for_white is a bool or one bool per position.
+
+        Returns (moves, offsets): moves is an (M, 2) array of (from square, to square) rows,
+        and the moves of position i are moves[offsets[i]:offsets[i+1]], in generate_moves order.
+        If a position has a jump to be made, only its jumps are listed.
+    '''
+    import numpy as np
+
+    positions = np.asarray(positions)
+    if positions.ndim == 3:
+        positions = from_boards(positions)
+    wm, bm, wk, bk = positions.astype(np.uint64).T
+
+    for_white = np.broadcast_to(np.asarray(for_white, dtype=bool), (len(positions),))
+
+    # Both colours on every board, then keep the one to move
+    white = _landings_batch(True, wm, bm, wk, bk)
+    black = _landings_batch(False, wm, bm, wk, bk)
+    side = for_white[:, None, None]
+    jumps = np.where(side, white[0], black[0])
+    steps = np.where(side, white[1], black[1])
+    back_jump = np.where(side, white[2], black[2])
+    back_step = np.where(side, white[3], black[3])
+
+    # Forced capture: a board with any jump only gets its jumps
+    must_jump = jumps.any(axis=(1, 2))[:, None, None]
+    found = np.where(must_jump, jumps, steps)
+    back = np.where(must_jump, back_jump, back_step)
+
+    board, direction, to = np.nonzero(found) # Ordered by board, then direction, then target
+    moves = np.stack([to - back[board, direction, to], to], axis=1)
+    offsets = np.zeros(len(positions) + 1, dtype=int)
+    np.cumsum(np.bincount(board, minlength=len(positions)), out=offsets[1:])
+
+    return moves, offsets
+
+
+def can_jump_batch(for_white, positions):
+    '''
+        can_jump for many positions at once: positions and for_white as generate_moves_batch takes them.
+        Returns an (N,) bool array.
+    '''
+    import numpy as np
+
+    positions = np.asarray(positions)
+    if positions.ndim == 3:
+        positions = from_boards(positions)
+    wm, bm, wk, bk = positions.astype(np.uint64).T
+    empty = np.uint64(FULL) ^ (wm | bm | wk | bk)
+
+    for_white = np.broadcast_to(np.asarray(for_white, dtype=bool), (len(positions),))
+    found = np.zeros(len(positions), dtype=bool)
+
+    for side in (True, False):
+        men, kings, enemy = _sides(side, wm, bm, wk, bk)
+        landings = np.zeros(len(positions), dtype=np.uint64)
+        for direction in FORWARD[side]:
+            landings |= _step_batch(_step_batch(men | kings, direction) & enemy, direction) & empty
+        for direction in BACKWARD[side]:
+            landings |= _step_batch(_step_batch(kings, direction) & enemy, direction) & empty
+        found |= (landings != 0) & (for_white == side)
+
+    return found
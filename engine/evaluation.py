@@ -0,0 +1,231 @@
+'''
+    The board evaluation of dame.eval_board, done with precomputed tables.
+
+    Every term of the score only looks at a piece and the squares around it:
+
+        + 2 for every piece, + 2 more if it's a super piece
+        - 3 for every enemy in front of it that could jump over it (the square behind it is empty)
+        - 3 for every enemy super piece behind it that could jump over it
+        + 2 for every enemy in front of it it could jump over
+        + 10 for every enemy behind it it could jump over, if it's a super piece
+
+    Those are the DEFAULT_WEIGHTS. If there's a weights.json next to the game (tune.py writes one,
+    fitted to played games), its weights are used instead, they're read once at import.
+
+    So for every square and colour the (jumped over square, landing square) pairs of these terms
+    are listed once at import, and a position is scored by looking those up.
+    Squares off the board are simply never listed, so there's no bounds checking to do
+    (and no index wrapping around to the other side of the board, like the old loops had).
+
+    Scoring the whole position like this is cheap enough that keeping the score up to date move by move
+    doesn't pay: a full score takes about 14 µs (9 µs of lookups, the rest making the codes out of the
+    bitboards), while the incremental version making a turn, scoring and taking it back took about 20 µs,
+    and it had to do that at every position of the search, not only at the ones that get scored.
+
+    The positions are given as 32 piece codes, one per dark square in bitboard.SQUARES order.
+    Only evaluate_batch and features_batch need NumPy, it's loaded the first time one's called.
+'''
+
+import os
+
+from . import bitboard as bb
+
+
+# The terms of the score, and what each one is worth
+FEATURES = ('piece', 'king', 'exposed_front', 'exposed_back', 'jump_forward', 'jump_backward')
+DEFAULT_WEIGHTS = {'piece': 2, 'king': 2, 'exposed_front': -3, 'exposed_back': -3, 'jump_forward': 2, 'jump_backward': 10}
+
+WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'weights.json') # Next to the game
+
+
+def _square(x, y):
+    return bb.SQUARE_OF[x][y] if 0 <= x < 8 and 0 <= y < 8 else None
+
+
+def _terms(for_white: bool, weights: dict):
+    '''
+        TERMS[s], KING_TERMS[s] of a colour: the (weight, jumped over square, landing square, enemy codes)
+        of the terms of a piece on square s, the king terms only count for super pieces.
+        TERM_FEATURES[s], KING_TERM_FEATURES[s] are the names of those terms.
+    '''
+    fw = -1 if for_white else 1 # Forward
+    men, kings = (2, 4) if for_white else (1, 3) # Enemy codes
+    enemy = (men, kings)
+
+    terms, king_terms, features, king_features = [], [], [], []
+    for x, y in bb.SQUARES:
+        found, king_found, named, king_named = [], [], [], []
+        for dx in (-1, 1):
+            candidates = [
+                (found, named, 'exposed_front', (x+dx, y+fw), (x-dx, y-fw), enemy),               # Can be jumped from the front
+                (found, named, 'exposed_back', (x+dx, y-fw), (x-dx, y+fw), (kings,)),             # Can be jumped from behind
+                (found, named, 'jump_forward', (x+dx, y+fw), (x+2*dx, y+2*fw), enemy),            # Can jump forward
+                (king_found, king_named, 'jump_backward', (x+dx, y-fw), (x+2*dx, y-2*fw), enemy), # Can jump backward
+            ]
+            for into, names, feature, over, land, codes in candidates:
+                over, land = _square(*over), _square(*land)
+                if over is not None and land is not None:
+                    into.append((weights[feature], over, land, codes))
+                    names.append(feature)
+        terms.append(found)
+        king_terms.append(king_found)
+        features.append(named)
+        king_features.append(king_named)
+    return terms, king_terms, features, king_features
+
+
+WEIGHTS = dict(DEFAULT_WEIGHTS)
+PIECE, KING = WEIGHTS['piece'], WEIGHTS['king']
+TERMS, KING_TERMS, TERM_FEATURES, KING_TERM_FEATURES = {}, {}, {}, {}
+
+
+def set_weights(weights: dict):
+    '''
+        Scores positions with other weights from now on (a {feature: weight} dict, missing ones stay as they are).
+        The weights have to be whole numbers, the search counts on the scores being whole.
+    '''
+    global PIECE, KING
+
+    unknown = set(weights) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown features: {', '.join(sorted(unknown))}")
+    if any(weight != int(weight) for weight in weights.values()):
+        raise ValueError("The weights have to be whole numbers.")
+
+    WEIGHTS.update({feature: int(weight) for feature, weight in weights.items()})
+    PIECE, KING = WEIGHTS['piece'], WEIGHTS['king']
+    for for_white in (True, False):
+        TERMS[for_white], KING_TERMS[for_white], TERM_FEATURES[for_white], KING_TERM_FEATURES[for_white] = \
+            _terms(for_white, WEIGHTS)
+    BATCH_TABLES.clear()
+
+
+def load_weights(path: str = WEIGHTS_PATH):
+    '''
+        Reads the weights of a JSON file ({"weights": {feature: weight}}, as tune.py writes it) and uses them.
+    '''
+    import json # Slow to load, and only needed if there's a file
+
+    with open(path) as file:
+        set_weights(json.load(file)['weights'])
+
+
+def weight_vector():
+    '''
+        The weights in FEATURES order.
+    '''
+    return [WEIGHTS[feature] for feature in FEATURES]
+
+
+BATCH_TABLES = {} # Made by features_batch when it's first needed
+
+set_weights(DEFAULT_WEIGHTS)
+if os.path.exists(WEIGHTS_PATH):
+    load_weights()
+
+
+def board_codes(board):
+    '''
+        The 32 piece codes of an 8x8 board.
+    '''
+    flat = board.ravel().tolist()
+    return [flat[i] for i in bb.FLAT]
+
+
+def piece_score(codes: list, s: int, for_white: bool):
+    '''
+        What the piece of for_white on square s adds to its player's score.
+    '''
+    piece = codes[s]
+    score = PIECE
+    if piece > 2:
+        score += KING
+        for weight, over, land, enemy in KING_TERMS[for_white][s]:
+            if codes[land] == 0 and codes[over] in enemy:
+                score += weight
+
+    for weight, over, land, enemy in TERMS[for_white][s]:
+        if codes[land] == 0 and codes[over] in enemy:
+            score += weight
+
+    return score
+
+
+def evaluate(codes: list, for_white: bool):
+    '''
+        Gives an int score based on how good the position is for a player, see eval_board.
+    '''
+    own = (1, 3) if for_white else (2, 4)
+    return sum(piece_score(codes, s, for_white) for s in range(32) if codes[s] in own)
+
+
+def _batch_tables(for_white: bool):
+    '''
+        The terms of a colour as (32, 8) arrays for features_batch, padded with terms
+        that never count (their squares point at the off-board column 32).
+    '''
+    import numpy as np
+
+    over = np.full((32, 8), 32)
+    land = np.full((32, 8), 32)
+    feature = np.full((32, 8), -1) # Index in FEATURES
+    kind = np.zeros((32, 8), dtype=int) # 0: any enemy, 1: enemy super piece only, 2: only for super pieces
+
+    for s in range(32):
+        terms = [(t, name, int(len(t[3]) == 1)) for t, name in zip(TERMS[for_white][s], TERM_FEATURES[for_white][s])] + \
+                [(t, name, 2) for t, name in zip(KING_TERMS[for_white][s], KING_TERM_FEATURES[for_white][s])]
+        for i, ((_, o, l, _), name, k) in enumerate(terms):
+            over[s, i], land[s, i], feature[s, i], kind[s, i] = o, l, FEATURES.index(name), k
+
+    return over, land, feature, kind
+
+
+def features_batch(positions, for_white: bool):
+    '''
+        How many times every term of the score counts for a player, for a whole array of positions at once.
+        positions is either an (N, 8, 8) array of boards or an (N, 32) array of piece codes.
+        Returns an (N, len(FEATURES)) array, whose rows times weight_vector() are the scores.
+    '''
+    import numpy as np
+
+    if not BATCH_TABLES:
+        BATCH_TABLES.update({for_white: _batch_tables(for_white) for for_white in (True, False)})
+
+    positions = np.asarray(positions)
+    if positions.ndim == 3:
+        positions = positions.reshape(len(positions), 64)[:, bb.FLAT]
+
+    man, king = (1, 3) if for_white else (2, 4)
+    enemy_man, enemy_king = (2, 4) if for_white else (1, 3)
+    over, land, feature, kind = BATCH_TABLES[for_white]
+
+    # Column 32 is off the board: not empty, not anybody's
+    codes = np.concatenate([positions, np.full((len(positions), 1), -1)], axis=1)
+    on_board = codes[:, :32]
+    own = (on_board == man) | (on_board == king)
+    is_king = on_board == king
+
+    over_codes = codes[:, over] # (N, 32, 8)
+    hits = ((codes[:, land] == 0) &
+            ((over_codes == enemy_king) | ((over_codes == enemy_man) & (kind != 1))) &
+            ((kind != 2) | is_king[:, :, None]) &
+            own[:, :, None])
+
+    counts = np.zeros((len(positions), len(FEATURES)), dtype=int)
+    counts[:, FEATURES.index('piece')] = own.sum(axis=1)
+    counts[:, FEATURES.index('king')] = (is_king & own).sum(axis=1)
+    for index in set(feature.ravel().tolist()) - {-1}:
+        counts[:, index] = (hits & (feature == index)).sum(axis=(1, 2))
+    return counts
+
+
+def evaluate_batch(positions, for_white: bool):
+    '''
+        Scores a whole array of positions at once for a player, the same way evaluate does.
+        positions is either an (N, 8, 8) array of boards or an (N, 32) array of piece codes.
+        Returns an (N,) array of scores.
+    '''
+    import numpy as np
+
+    return features_batch(positions, for_white) @ np.array(weight_vector())
+
@@ -0,0 +1,175 @@
+'''
+    Positions of the engine: the four bitboards of bitboard.py and who's to move, in one small tuple.
+
+    A position never changes, playing a move gives a new one, so positions can be
+    kept around, compared and used as dictionary keys as they are.
+'''
+
+from collections import namedtuple
+from functools import lru_cache
+
+from . import bitboard as bb
+
+
+# A whole turn of a player: the squares the piece goes through (where it starts first),
+# the squares of the pieces it jumps over, and whether it gets promoted on the way.
+# Squares are (x, y) board indices, x the column and y = 0 the top row (row 8).
+Move = namedtuple("Move", ["path", "captured", "promotes"])
+
+
+def move_of(turn: tuple):
+    '''
+        A (path, captured, promotes) turn of bitboard.generate_turns, with square numbers, as a Move.
+    '''
+    path, captured, promotes = turn
+    return Move(tuple(bb.SQUARES[s] for s in path), tuple(bb.SQUARES[s] for s in captured), promotes)
+
+def turn_of(move: Move):
+    '''
+        A Move as a bitboard turn, the other way around from move_of.
+    '''
+    return (tuple(bb.SQUARE_OF[x][y] for x, y in move.path), tuple(bb.SQUARE_OF[x][y] for x, y in move.captured),
+            move.promotes)
+
+def mirror_move(move: Move):
+    '''
+        A move on the mirrored position (see Position.mirror): every square turned half way around the board.
+        Doing it twice gives the move back.
+    '''
+    return Move(tuple((7-x, 7-y) for x, y in move.path), tuple((7-x, 7-y) for x, y in move.captured), move.promotes)
+
+def square_name(square: tuple):
+    '''
+        The name of a square of the board, like c3.
+    '''
+    x, y = square
+    return "abcdefgh"[x] + str(8-y)
+
+def turn_name(turn: Move):
+    '''
+        A whole turn written down, like c3-d4 for a step or c3xe5xc7 for a chain of jumps.
+    '''
+    return ('x' if turn.captured else '-').join(square_name(square) for square in turn.path)
+
+
+class Position(namedtuple("Position", ["wm", "bm", "wk", "bk", "white_to_move"])):
+    '''
+        The white men, black men, white kings and black kings bitboards, and whether white is to move.
+    '''
+
+    __slots__ = ()
+
+    @classmethod
+    def read(cls, text: str):
+        '''
+            Reads a position written like "W:Wc3,e3,Kd4:Bb6,Kf8": the player to move (W or B),
+            then the white pieces and the black pieces, K marks a super piece.
+            Raises ValueError if the text makes no sense.
+        '''
+        masks = [0, 0, 0, 0]
+
+        to_move, *sides = text.strip().split(':')
+        if to_move.upper() not in ('W', 'B') or len(sides) != 2:
+            raise ValueError(f"Not a position: {text!r}")
+
+        for side in sides:
+            colour, names = side[:1].upper(), side[1:]
+            if colour not in ('W', 'B'):
+                raise ValueError(f"Not a position: {text!r}")
+
+            for piece in filter(None, names.split(',')):
+                king = piece[:1].upper() == 'K'
+                square = piece[1:] if king else piece
+
+                if len(square) != 2 or square[0] not in "abcdefgh" or square[1] not in "12345678":
+                    raise ValueError(f"Not a square: {square!r}")
+                s = bb.SQUARE_OF["abcdefgh".index(square[0])][8 - int(square[1])]
+                if s is None or (masks[0] | masks[1] | masks[2] | masks[3]) >> s & 1:
+                    raise ValueError(f"Can't put a piece on {square}")
+
+                masks[(colour != 'W') + 2*king] |= 1 << s
+
+        return cls(*masks, to_move.upper() == 'W')
+
+    @classmethod
+    def start(cls):
+        '''
+            The position every game starts from.
+        '''
+        return cls((1 << 32) - (1 << 20), (1 << 12) - 1, 0, 0, True)
+
+    @classmethod
+    def from_board(cls, board, white_to_move: bool):
+        '''
+            The position of an 8x8 board (as the game keeps it).
+        '''
+        return cls(*bb.from_board(board), white_to_move)
+
+    def text(self):
+        '''
+            Writes the position down the way read reads it.
+        '''
+        sides = []
+        for colour, men, kings in (('W', self.wm, self.wk), ('B', self.bm, self.bk)):
+            names = [('K' if kings >> s & 1 else '') + square_name(bb.SQUARES[s]) for s in bb.squares(men | kings)]
+            sides.append(colour + ','.join(names))
+
+        return ':'.join(['W' if self.white_to_move else 'B'] + sides)
+
+    def board(self):
+        '''
+            The position as an 8x8 board, this one needs NumPy.
+        '''
+        return bb.to_board(self.wm, self.bm, self.wk, self.bk)
+
+    def codes(self):
+        '''
+            The 32 piece codes of the position, in bitboard.SQUARES order (as evaluation.py takes them).
+        '''
+        codes = [0] * 32
+        for code, mask in enumerate((self.wm, self.bm, self.wk, self.bk), start=1):
+            for s in bb.squares(mask):
+                codes[s] = code
+        return codes
+
+    def pieces(self):
+        '''
+            How many pieces are on the board.
+        '''
+        return (self.wm | self.bm | self.wk | self.bk).bit_count()
+
+    def mirror(self):
+        '''
+            The same position seen from the other side: the board turned half way around,
+            the colours swapped, the other player to move. Moves map over with mirror_move.
+        '''
+        return Position(*bb.mirror(*self[:4]), not self.white_to_move)
+
+    def canonical(self):
+        '''
+            The position with white to move (the mirror if black is to move), and whether it's the mirror.
+            A position and its mirror have the same canonical position, so caches keyed on it store them once.
+        '''
+        return (self.mirror(), True) if not self.white_to_move else (self, False)
+
+    def moves(self):
+        '''
+            Every whole turn the player to move can take, in bitboard.generate_turns order.
+            Worked out once for the last few thousand positions asked about, the game (dame.legal_moves)
+            and the root of the search share them.
+        '''
+        return _moves(self)
+
+    def play(self, move: Move):
+        '''
+            The position after a move (one of moves()).
+        '''
+        return Position(*bb.play(self.white_to_move, *self[:4], *turn_of(move)), not self.white_to_move)
+
+    def __str__(self):
+        return self.text()
+
+
+@lru_cache(maxsize=4096)
+def _moves(position: Position):
+    return tuple(map(move_of, bb.generate_turns(position.white_to_move, *position[:4])))
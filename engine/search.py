@@ -0,0 +1,421 @@
+'''
+    The robot's search: a negamax with alpha-beta pruning, done on the bitboards of a Position.
+
+    It's the one search there is. dame_ai.Dame_AI is a Search with the game around it (the board,
+    the opening book, worker processes for the root moves, thinking on the enemy's time),
+    everything below is shared: the move ordering, the transposition table, the captures
+    played out at the end of the lines, and the endgame tablebase if there is one.
+
+    The transposition table (see transposition.py) is keyed on canonical positions, so a position and its
+    mirror with the other player to move share an entry, whichever colour the search is for.
+'''
+
+import sys
+import threading
+import time
+
+from . import bitboard as bb
+from . import evaluation as ev
+from . import transposition as tt
+from .position import Position, move_of, turn_of
+
+
+# How deep think goes at most if time doesn't run out first
+MAX_DEPTH = 50
+
+# The clock is only looked at every this many positions, looking is slow
+CLOCK_EVERY = 64
+
+# Positions the capture search may visit at the end of every line
+QUIESCENCE_NODES = 64
+
+# Score of a won position the tablebase knows: WIN - turns until the end (so faster wins score higher)
+WIN = 1_000_000
+
+INF = float('inf')
+
+
+class OutOfTime(Exception):
+    '''
+        Raised inside the search when its time is up.
+    '''
+
+
+def _below(score):
+    '''
+        The highest possible score below score (scores are whole numbers or infinite).
+    '''
+    if score == INF:
+        return sys.float_info.max
+    return score - 1
+
+def _codes(wm: int, bm: int, wk: int, bk: int):
+    codes = [0] * 32
+    for code, mask in enumerate((wm, bm, wk, bk), start=1):
+        while mask:
+            low = mask & -mask
+            codes[low.bit_length() - 1] = code
+            mask ^= low
+    return codes
+
+def _canonical_turns(for_white: bool, wm: int, bm: int, wk: int, bk: int):
+    '''
+        The turns of the player to move, in the order generate_turns lists them on the position turned so that
+        white is to move (see bitboard.canonical). A position and its mirror list the same turns in the same order.
+    '''
+    if for_white:
+        return list(bb.generate_turns(True, wm, bm, wk, bk))
+    return [bb.mirror_turn(turn) for turn in bb.generate_turns(True, *bb.mirror(wm, bm, wk, bk))]
+
+def evaluate(position: Position, for_white: bool):
+    '''
+        The score of a position for a player, like dame.eval_board gives it.
+    '''
+    return ev.evaluate(position.codes(), for_white)
+
+
+class Search:
+    '''
+        Searches positions for the best move of the player to move.
+        Keeps its transposition table between searches, for both colours.
+    '''
+
+    def __init__(self, quiescence: int = QUIESCENCE_NODES, table: tt.TranspositionTable = None, tablebase = None):
+        '''
+            The lines of the search don't end in the middle of a capture: the captures are played out
+            first, visiting up to quiescence positions per line (see quiesce). 0 turns that off.
+
+            The searched positions are remembered in table, a default sized one is made if none is given.
+
+            With a tablebase (a tablebase.Tablebase), positions with few enough pieces left aren't searched
+            any further, the search takes the tablebase's exact score for them.
+        '''
+        self.quiescence = quiescence
+        self.table = table if table is not None else tt.TranspositionTable()
+        self.tablebase = tablebase
+        self.is_white = None # The player the search is for
+        self.budget = 0 # Positions the quiescence search that's running may still visit
+
+        # Move ordering memory of the search
+        self.killers = []
+        self.history = {}
+        self.pv = [] # Best line of the last iterative deepening step, as turns
+        self.line = [] # Best line of the last search, as Moves
+
+        # Clock of the search
+        self.deadline = None
+        self.stopping = threading.Event() # Set by stop() to make the search give up early, new for every search
+        self.nodes = 0
+
+    def stop(self):
+        '''
+            Asks the search that's running (in another thread) to give up as soon as it can.
+            A think then returns the deepest move it finished, a choose_move with a deadline raises OutOfTime.
+            The next choose_move or think isn't stopped by it.
+        '''
+        self.stopping.set()
+
+    def choose_move(self, position: Position, depth: int, deadline: float = None):
+        '''
+            The (move, score) of the player to move, looking depth turns of both players ahead
+            (2*depth + 1 turns in all, the last one the player's own).
+
+            It picks the very same move as a full minmax would, ties included: the first of the equally good
+            moves in Position.moves() order, or the first that leaves the enemy without a move if there is
+            such a move. The move is None if there's none.
+            If a deadline (in time.perf_counter() seconds) is given and the search runs past it, OutOfTime is raised.
+
+            The best line of play found is left in self.line.
+        '''
+        self.stopping = threading.Event()
+        return self.search(position, depth, deadline)
+
+    def search(self, position: Position, depth: int, deadline: float = None):
+        '''
+            What choose_move does. think goes through this one at every depth, so a subclass
+            can take choose_move for a different way of giving the position (like Dame_AI does).
+        '''
+        for_white = self.is_white = position.white_to_move
+        bits = position[:4]
+
+        turns = list(map(turn_of, position.moves())) # The same list the game looked at (see dame.legal_moves)
+        if not turns:
+            self.line = []
+            return None, -INF
+
+        plies = 2*depth + 1
+        self.killers = [[] for _ in range(plies)]
+        self.history = {key: value//2 for key, value in self.history.items()} # Old news matter less
+        self.table.new_search()
+        self.deadline = deadline
+
+        key = tt.hash_position(for_white, *bits)
+        entry = self.table.probe(key, for_white)
+        hash_turn = entry[3] if entry is not None else None
+        pv_turn = self.pv[0] if self.pv else None
+
+        ordered = sorted(enumerate(turns),
+                         key=lambda item: self.move_priority(item[1], for_white, 0, hash_turn, pv_turn))
+
+        best_idx, best_score, line = self.search_root(ordered, plies, key, position)
+        self.table.store(key, for_white, plies, tt.EXACT, best_score, turns[best_idx])
+        if line is None:
+            line = self.principal_variation(plies, position)
+        self.line = [move_of(turn) for turn in line]
+
+        if best_score == INF and depth > 0:
+
+            # Winning right away beats winning later
+            for turn in turns:
+                if not bb.generate_moves(not for_white, *bb.play(for_white, *bits, *turn)):
+                    return move_of(turn), best_score
+
+        return move_of(turns[best_idx]), best_score
+
+    @staticmethod
+    def root_alpha(best_score: float, idx: int, best_idx: int):
+        '''
+            The alpha to search the idx-th move of the root with, when the best so far is the best_idx-th one.
+            A move listed earlier wins a tie, so it has to be told apart from an equal score.
+        '''
+        return best_score if idx > best_idx else _below(best_score)
+
+    def search_root(self, ordered: list, plies: int, key: int, position: Position):
+        '''
+            Scores the moves of the root, ordered has the (index, turn) pairs in the order they should be looked at.
+            Returns the index of the best move, its score, and its line (None to read it from the table).
+        '''
+        for_white = position.white_to_move
+        pv_turn = self.pv[0] if self.pv else None
+
+        best_idx, best_score = len(ordered), -INF
+        for idx, turn in ordered:
+            alpha = self.root_alpha(best_score, idx, best_idx)
+
+            child_key = key ^ tt.turn_key(for_white, *position[:4], turn)
+            score = -self.negamax(plies-1, not for_white, -INF, -alpha, 1, child_key,
+                                  *bb.play(for_white, *position[:4], *turn), on_pv = turn == pv_turn)
+
+            if score > best_score or (idx < best_idx and score >= best_score):
+                best_idx, best_score = idx, score
+
+        return best_idx, best_score, None
+
+    def think(self, position: Position, time_limit: float = None, max_depth: int = MAX_DEPTH, deadline: float = None,
+              on_progress = None, stopping: threading.Event = None):
+        '''
+            Iterative deepening: chooses a move at depth 0, 1, 2, ... until time_limit milliseconds run out,
+            and returns the (move, score, depth) of the deepest search that could finish.
+
+            Every step starts with the best line of the step before, so the moves most likely
+            to be good are looked at first. Depth 0 is always finished, even if it's late.
+            The time can also be given as a deadline in time.perf_counter() seconds. Without either,
+            it keeps going until max_depth or until stop() is called.
+
+            on_progress(depth, move, score, line) is called after every finished step.
+
+            stopping is the event stop() sets for this think, a new one if none is given
+            (so whoever starts the think can stop it without going through the search).
+        '''
+        self.stopping = stopping if stopping is not None else threading.Event()
+        if deadline is None:
+            deadline = time.perf_counter() + time_limit / 1000 if time_limit is not None else INF
+
+        self.pv = []
+        result = None
+
+        try:
+            for depth in range(max_depth + 1):
+                if depth > 0 and self.stopping.is_set():
+                    break
+
+                move, score = self.search(position, depth, deadline if depth > 0 else None)
+                result = move, score, depth
+                if on_progress is not None:
+                    on_progress(depth, move, score, list(self.line))
+
+                # Nothing to think about, or the outcome is already known
+                if move is None or len(position.moves()) == 1 or abs(score) >= WIN - 255:
+                    break
+
+                self.pv = [turn_of(move) for move in self.line]
+
+        except OutOfTime: # Too bad, the last finished depth has to do
+            pass
+
+        finally:
+            self.deadline = None
+            self.pv = []
+
+        return result
+
+    def negamax(self, plies: int, for_white: bool, alpha: float, beta: float, ply: int, key: int,
+                wm: int, bm: int, wk: int, bk: int, on_pv: bool = False):
+        '''
+            Score of a position for the player whose turn it is, looking plies moves ahead.
+
+            Scores between alpha and beta are exact. A score at most alpha only says the
+            player can't do better than that, at least beta only says it can't do worse,
+            the search stops looking as soon as it knows that much.
+
+            The positions at the end of the line are scored by quiesce, or by the evaluation for the player
+            who just moved there (the searching player) without quiescence. A player without moves has lost.
+
+            Positions in the tablebase (if there is one) get its exact score right away:
+            WIN minus the turns left for a win, the negative of that for a loss, 0 for a draw.
+
+            key is the Zobrist hash of the position with for_white to move. Scores are only taken from
+            the transposition table if they were searched exactly as deep, so the result is
+            the same as without the table. Entries of any depth still tell which move to try first.
+
+            on_pv tells if the line so far is the start of the best line of the previous
+            iterative deepening step, whose next move is then tried first.
+        '''
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % CLOCK_EVERY == 0 and (time.perf_counter() > self.deadline
+                                                                            or self.stopping.is_set()):
+            raise OutOfTime
+
+        alpha_orig = alpha
+        entry = self.table.probe(key, for_white)
+        hash_turn = None
+
+        if entry is not None:
+            depth, kind, score, hash_turn = entry
+            if depth == plies and (kind == tt.EXACT or
+                                   (kind == tt.LOWER and score >= beta) or
+                                   (kind == tt.UPPER and score <= alpha)):
+                return score
+
+        if self.tablebase is not None and (wm | bm | wk | bk).bit_count() <= self.tablebase.pieces:
+            score = self.tablebase.score_bitboards(for_white, wm, bm, wk, bk)
+            if score is not None:
+                return score
+
+        if plies == 0:
+            if self.quiescence:
+                self.budget = self.quiescence
+                score = self.quiesce(for_white, wm, bm, wk, bk)
+            else:
+                score = -ev.evaluate(_codes(wm, bm, wk, bk), not for_white)
+            self.table.store(key, for_white, 0, tt.EXACT, score, None)
+            return score
+
+        turns = list(bb.generate_turns(for_white, wm, bm, wk, bk))
+        if not turns:
+            return -INF
+
+        pv_turn = self.pv[ply] if on_pv and ply < len(self.pv) else None
+
+        best_score, best_turn = -INF, None
+        for turn in self.order_moves(turns, for_white, ply, hash_turn, pv_turn):
+
+            child_key = key ^ tt.turn_key(for_white, wm, bm, wk, bk, turn)
+            score = -self.negamax(plies-1, not for_white, -beta, -alpha, ply+1, child_key,
+                                  *bb.play(for_white, wm, bm, wk, bk, *turn), on_pv = turn == pv_turn)
+
+            if score > best_score:
+                best_score, best_turn = score, turn
+                alpha = max(alpha, score)
+
+                if alpha >= beta: # The other player won't let it come to this
+
+                    # Remember the refutation for the siblings and later searches
+                    if not turn[1]:
+                        killers = self.killers[ply]
+                        if turn not in killers:
+                            killers.insert(0, turn)
+                            del killers[2:]
+                    self.history[for_white, turn] = self.history.get((for_white, turn), 0) + plies*plies
+                    break
+
+        if best_score <= alpha_orig:
+            kind = tt.UPPER
+        elif best_score >= beta:
+            kind = tt.LOWER
+        else:
+            kind = tt.EXACT
+        self.table.store(key, for_white, plies, kind, best_score, best_turn)
+
+        return best_score
+
+    def quiesce(self, for_white: bool, wm: int, bm: int, wk: int, bk: int):
+        '''
+            Score of a position at the end of a line of the search, for the player whose turn it is.
+
+            Jumping is a must, so while the player to move has a jump, the position isn't scored yet:
+            every capture is played out (and the captures after it...) until a position without one is
+            reached, which is scored for the searching player. After self.budget positions it stops
+            playing out and scores what it has.
+
+            Nothing is cut off with alpha and beta here, and the captures are always played out in the order
+            of the position turned so that white is to move (see _canonical_turns). So where the budget runs out
+            only depends on the position, not on which colour it's seen from, and the score goes into the table
+            like any other: a position and its mirror share an entry.
+        '''
+        if self.tablebase is not None and (wm | bm | wk | bk).bit_count() <= self.tablebase.pieces:
+            score = self.tablebase.score_bitboards(for_white, wm, bm, wk, bk)
+            if score is not None:
+                return score
+
+        turns = _canonical_turns(for_white, wm, bm, wk, bk)
+        if not turns:
+            return -INF
+
+        if not turns[0][1] or self.budget <= 0: # Quiet (or no time to look further)
+            score = ev.evaluate(_codes(wm, bm, wk, bk), self.is_white)
+            return score if for_white == self.is_white else -score
+
+        best_score = -INF
+        for turn in turns:
+            self.nodes += 1
+            self.budget -= 1
+            if self.deadline is not None and self.nodes % CLOCK_EVERY == 0 and (time.perf_counter() > self.deadline
+                                                                                or self.stopping.is_set()):
+                raise OutOfTime
+
+            best_score = max(best_score, -self.quiesce(not for_white, *bb.play(for_white, wm, bm, wk, bk, *turn)))
+
+        return best_score
+
+    def move_priority(self, turn: tuple, for_white: bool, ply: int, hash_turn: tuple = None, pv_turn: tuple = None):
+        '''
+            Sort key that puts the moves most likely to cut the search short first.
+
+            The move of the previous best line (pv_turn) goes first, then the best move
+            found the last time the position was searched (hash_turn).
+            Jumps come next, the more pieces jumped over the better (if there's a jump to be made,
+            there are only jumps, so this only sorts the jumps among each other).
+            Then killer moves (steps that refuted something at the same ply),
+            then the moves by how often they refuted things before (the history heuristic).
+        '''
+        return (turn != pv_turn, turn != hash_turn, -len(turn[1]), turn not in self.killers[ply],
+                -self.history.get((for_white, turn), 0))
+
+    def order_moves(self, turns: list, for_white: bool, ply: int, hash_turn: tuple = None, pv_turn: tuple = None):
+        '''
+            Sorts the turns by move_priority.
+        '''
+        return sorted(turns, key=lambda turn: self.move_priority(turn, for_white, ply, hash_turn, pv_turn))
+
+    def principal_variation(self, plies: int, position: Position):
+        '''
+            The best line of play from a position found by the last search, as bitboard turns,
+            read back from the transposition table. Stops early where the table lost track of it.
+        '''
+        for_white, bits = position.white_to_move, position[:4]
+        key = tt.hash_position(for_white, *bits)
+        line = []
+
+        for _ in range(plies):
+            entry = self.table.probe(key, for_white)
+            if entry is None or entry[3] not in bb.generate_turns(for_white, *bits):
+                break
+
+            turn = entry[3]
+            key ^= tt.turn_key(for_white, *bits, turn)
+            bits = bb.play(for_white, *bits, *turn)
+            line.append(turn)
+            for_white = not for_white
+
+        return line
@@ -0,0 +1,242 @@
+'''
+    Transposition table for the robot's search, keyed by Zobrist hashes.
+
+    A Zobrist hash is the xor of a random number for every (piece, square) on the board,
+    and one more for black to move. Moving a piece only changes a handful of those,
+    so the hash of the next position is the old one xor a few numbers (see turn_key),
+    there is no need to look at the whole position again.
+
+    A position with black to move is the same as its mirror (the board turned half way around,
+    colours swapped) with white to move. The numbers of the black pieces are those of the white pieces
+    on the turned square with their two halves swapped, so the hash of the mirror is the hash of the position
+    with its halves swapped, and the table keys every position by its white to move version
+    (canonical_key) without looking at the board. A position and its mirror then share one entry.
+'''
+
+import random
+
+from . import bitboard as bb
+
+
+def _swap_halves(key: int):
+    return ((key << 32) | (key >> 32)) & 0xFFFF_FFFF_FFFF_FFFF
+
+# Random numbers of the pieces: PIECE_KEYS[piece code][x][y], the empty square (0) has none.
+# A black piece on (x, y) gets the number of the white piece on (7-x, 7-y), halves swapped.
+_rng = random.Random(0x5EED_DA3E)
+PIECE_KEYS = [[[0]*8 for _ in range(8)]] + [
+    [[_rng.getrandbits(64) for _ in range(8)] for _ in range(8)] if code in (1, 3) else None for code in range(1, 5)
+]
+for _code in (2, 4):
+    PIECE_KEYS[_code] = [[_swap_halves(PIECE_KEYS[_code - 1][7-x][7-y]) for y in range(8)] for x in range(8)]
+BLACK_TO_MOVE = _rng.getrandbits(64)
+
+# The same numbers by bitboard square: SQUARE_KEYS[piece code][s]
+SQUARE_KEYS = [[PIECE_KEYS[code][x][y] for x, y in bb.SQUARES] for code in range(5)]
+
+# Kind of score stored in an entry
+EXACT = 0
+LOWER = 1 # The score is at least this much (the search failed high)
+UPPER = 2 # The score is at most this much (the search failed low)
+
+# Ways to decide if a new entry can take the place of an old one
+REPLACEMENT = ('always', 'depth')
+
+# Rough size of an entry in bytes: the slot in both lists, the tuple and what's in it
+ENTRY_BYTES = 16 + 96 + 3*32
+
+
+def hash_position(for_white: bool, wm: int, bm: int, wk: int, bk: int):
+    '''
+        Zobrist hash of the bitboards of a position and the player to move, from scratch.
+    '''
+    key = 0 if for_white else BLACK_TO_MOVE
+    for code, mask in enumerate((wm, bm, wk, bk), start=1):
+        keys = SQUARE_KEYS[code]
+        for s in bb.squares(mask):
+            key ^= keys[s]
+    return key
+
+
+def hash_board(board, white_to_move: bool):
+    '''
+        Zobrist hash of a board and the player to move, from scratch.
+    '''
+    return hash_position(white_to_move, *bb.from_board(board))
+
+
+def canonical_key(key: int, white_to_move: bool):
+    '''
+        The hash of the white to move version of a position (itself, or its mirror if black is to move),
+        from the position's own hash.
+    '''
+    return key if white_to_move else _swap_halves(key ^ BLACK_TO_MOVE)
+
+
+def canonical(board, white_to_move: bool):
+    '''
+        The canonical key of a board and the player to move, and whether it's the key of the mirror
+        (then the moves stored under it have to go through engine.mirror_move to fit the board).
+    '''
+    return canonical_key(hash_board(board, white_to_move), white_to_move), not white_to_move
+
+
+def turn_key(for_white: bool, wm: int, bm: int, wk: int, bk: int, turn: tuple):
+    '''
+        What the hash changes by when for_white takes a turn of bitboard.generate_turns (xor it in).
+        The bitboards are those from before the turn.
+    '''
+    path, captured, promotes = turn
+    fro, to = path[0], path[-1]
+    kings = wk | bk
+
+    piece = (1 if for_white else 2) + 2 * (kings >> fro & 1)
+    landed = piece + 2 if promotes else piece
+    key = SQUARE_KEYS[piece][fro] ^ SQUARE_KEYS[landed][to] ^ BLACK_TO_MOVE
+
+    enemy = 2 if for_white else 1
+    for s in captured: # Jumped over these
+        key ^= SQUARE_KEYS[enemy + 2 * (kings >> s & 1)][s]
+
+    return key
+
+
+class TranspositionTable:
+    '''
+        A fixed-size table of already searched positions.
+
+        Every position has exactly one slot, chosen by the low bits of its canonical hash (a position
+        and its mirror with the other player to move have the same one, see canonical_key).
+        The hash and the player to move are given to every method, the table takes care of the rest:
+        a best move (a bitboard.generate_turns turn) stored for one of the two comes out turned
+        (bitboard.mirror_turn) when the other asks.
+
+        An entry remembers the full hash, how deep the position was searched, the score with its kind
+        (EXACT, LOWER or UPPER), the best move, which search stored it and who was to move then.
+
+        When two positions want the same slot, the replacement policy decides:
+            'always': the newer one wins.
+            'depth': the deeper searched one wins, but anything left over
+                     from an earlier search can be replaced.
+    '''
+
+    def __init__(self, megabytes: float = 32, replacement: str = 'depth'):
+        '''
+            Makes the largest table (with a power of two slots) that fits into roughly megabytes of memory.
+        '''
+
+        if replacement not in REPLACEMENT:
+            raise ValueError(f"Unknown replacement policy {replacement!r}, pick one of {REPLACEMENT}.")
+
+        self.megabytes = megabytes
+        slots = max(1, int(megabytes * 2**20) // ENTRY_BYTES)
+        self.size = 1 << (slots.bit_length() - 1)
+        self.mask = self.size - 1
+        self.replacement = replacement
+
+        self.keys = [None] * self.size
+        self.entries = [None] * self.size
+        self.age = 0
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        '''
+            Zeroes the counters.
+        '''
+        self.hits = 0       # The position was there
+        self.misses = 0     # The position wasn't there
+        self.collisions = 0 # ... because another position took its slot
+        self.stores = 0     # Entries written
+        self.overwrites = 0 # Entries of another position thrown away for a new one
+        self.rejects = 0    # Entries not written because the old one was worth more
+
+    def stats(self):
+        '''
+            The counters and how full the table is, as a dict.
+        '''
+        probes = self.hits + self.misses
+        return {
+            'size': self.size,
+            'used': self.size - self.keys.count(None),
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'hit_rate': self.hits / probes if probes else 0.0,
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+            'rejects': self.rejects,
+        }
+
+    def new_search(self):
+        '''
+            Marks everything stored so far as coming from an earlier search.
+        '''
+        self.age += 1
+
+    def clear(self):
+        '''
+            Forgets every position.
+        '''
+        self.keys = [None] * self.size
+        self.entries = [None] * self.size
+
+    def probe(self, key: int, white_to_move: bool):
+        '''
+            Returns the (depth, kind, score, move) stored for a position, or None.
+        '''
+        if not white_to_move:
+            key = _swap_halves(key ^ BLACK_TO_MOVE) # canonical_key, without the call
+        slot = key & self.mask
+        stored = self.keys[slot]
+
+        if stored == key:
+            self.hits += 1
+            depth, kind, score, move, _, side = self.entries[slot]
+            if side != white_to_move and move is not None:
+                move = bb.mirror_turn(move)
+            return depth, kind, score, move
+
+        self.misses += 1
+        if stored is not None:
+            self.collisions += 1
+        return None
+
+    def peek(self, key: int, white_to_move: bool):
+        '''
+            Like probe, but without counting it as a hit or a miss.
+        '''
+        key = canonical_key(key, white_to_move)
+        slot = key & self.mask
+        if self.keys[slot] == key:
+            depth, kind, score, move, _, side = self.entries[slot]
+            if side != white_to_move and move is not None:
+                move = bb.mirror_turn(move)
+            return depth, kind, score, move
+        return None
+
+    def store(self, key: int, white_to_move: bool, depth: int, kind: int, score: float, move: tuple):
+        '''
+            Remembers a searched position, if the replacement policy lets it.
+            The move is kept the way it fits the position it's given for, and only turned when its mirror asks for it.
+        '''
+        if not white_to_move:
+            key = _swap_halves(key ^ BLACK_TO_MOVE)
+        slot = key & self.mask
+        stored = self.keys[slot]
+
+        if stored is not None:
+            old_depth, _, _, old_move, old_age, old_side = self.entries[slot]
+
+            if self.replacement == 'depth' and old_age == self.age and old_depth > depth:
+                self.rejects += 1
+                return
+
+            if stored != key:
+                self.overwrites += 1
+            elif move is None: # Don't lose the best move of a position just because this search found none
+                move = old_move if old_side == white_to_move or old_move is None else bb.mirror_turn(old_move)
+
+        self.keys[slot] = key
+        self.entries[slot] = (depth, kind, score, move, self.age, white_to_move)
+        self.stores += 1
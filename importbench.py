@@ -0,0 +1,116 @@
+'''
+    Import benchmark: how long the modules take to load in a fresh Python, to catch slow startups.
+
+    Every worker process and every short command line call loads its modules again, so the time
+    it takes adds up. Every module is imported in a new interpreter a few times, and the fastest
+    and typical (median) times are shown, along with the heavy modules it pulled in.
+    The modules are compiled first, so the times are those of a normal start, not of a first one.
+
+    With --check, the engine package (see engine/__init__.py) has to load within ENGINE_BUDGET
+    milliseconds without loading any of ENGINE_MUST_NOT_LOAD, and the program fails if it doesn't.
+
+        python importbench.py
+        python importbench.py --check
+        python importbench.py --modules engine dame --runs 20
+'''
+
+import argparse
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+
+
+MODULES = ['engine', 'engine.bitboard', 'engine.evaluation', 'dame', 'dame_ai', 'server']
+
+# Modules that are slow to load, or that the engine shouldn't need
+HEAVY = ['numpy', 'asyncio', 'concurrent.futures', 'multiprocessing', 'mainmenu', 'dame', 'dame_ai']
+
+ENGINE_BUDGET = 25 # Milliseconds
+ENGINE_MUST_NOT_LOAD = HEAVY
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Run in the new interpreter: import a module, say how long it took and what got loaded
+_PROBE = '''
+import sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+print((time.perf_counter() - start) * 1000)
+print(' '.join(sys.modules))
+'''
+
+
+def time_import(module: str):
+    '''
+        Imports a module in a new interpreter, returns the milliseconds it took and the names of every loaded module.
+    '''
+    result = subprocess.run([sys.executable, '-c', _PROBE, module], cwd=HERE, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    ms, loaded = result.stdout.splitlines()
+    return float(ms), set(loaded.split())
+
+
+def bench(modules: list, runs: int = 5):
+    '''
+        The (module, fastest ms, median ms, heavy modules it loaded) of every module.
+    '''
+    compileall.compile_dir(HERE, maxlevels=1, quiet=1)
+
+    results = []
+    for module in modules:
+        times, loaded = [], set()
+        for _ in range(runs):
+            ms, loaded = time_import(module)
+            times.append(ms)
+        heavy = [name for name in HEAVY if name in loaded and name != module]
+        results.append((module, min(times), statistics.median(times), heavy))
+    return results
+
+
+def check(results: list):
+    '''
+        Whether the engine loaded fast enough and without anything it shouldn't need, says what went wrong if not.
+    '''
+    good = True
+    for module, _, median, heavy in results:
+        if module != 'engine':
+            continue
+
+        if median > ENGINE_BUDGET:
+            print(f"engine took {median:.1f} ms to load, it should take at most {ENGINE_BUDGET} ms.")
+            good = False
+
+        loaded = [name for name in heavy if name in ENGINE_MUST_NOT_LOAD]
+        if loaded:
+            print(f"engine loaded {', '.join(loaded)}, it shouldn't need to.")
+            good = False
+
+    return good
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Time how long the modules take to load.")
+    parser.add_argument('--modules', nargs='+', default=MODULES)
+    parser.add_argument('--runs', type=int, default=5, help="imports of every module, each in a new interpreter")
+    parser.add_argument('--check', action='store_true', help="fail if the engine loads too slowly or loads too much")
+    args = parser.parse_args(argv)
+
+    modules = args.modules if not args.check or 'engine' in args.modules else ['engine'] + args.modules
+    results = bench(modules, args.runs)
+
+    print(f"{'module':<12} {'fastest':>9} {'median':>9}  loads")
+    for module, fastest, median, heavy in results:
+        print(f"{module:<12} {fastest:>6.1f} ms {median:>6.1f} ms  {', '.join(heavy) or '-'}")
+
+    if args.check:
+        good = check(results)
+        print("All good." if good else "The engine loads too SLOWLY.")
+        sys.exit(0 if good else 1)
+
+
+if __name__ == "__main__":
+    main()
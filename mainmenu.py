@@ -17,10 +17,17 @@ class MainMenu:
 	def setup_vs_ai(self):
 		'''
 			Choose Team to play as, and how smart the robot should be.
+			The robot either thinks a fixed number of moves ahead (IQ),
+			or as far as it can in a fixed number of milliseconds per move (time_limit).
+			Returns team, IQ, time_limit, one of the last two is None.
 		'''
 		team = input("Enter 0 to play as White, anything else for Black.\nTeam: ") == "0"
+
+		if input("Enter 0 to pick how smart the robot is, anything else to pick how long it thinks.\nMode: ") != "0":
+			return team, None, self.setup_time_limit()
+
 		IQ = -1
-		MaxIQ = 3
+		MaxIQ = 6
 		print(f"How smart should the robot be on a semi-logarithmic scale of 0 to {MaxIQ}?")
 		while IQ not in range(MaxIQ+1):
 			
@@ -35,7 +42,24 @@ class MainMenu:
 				elif IQ < 0:
 					print("ha-ha. very funny. no.")
 
-		return team, IQ
+		return team, IQ, None
+
+	def setup_time_limit(self):
+		'''
+			Choose how many milliseconds the robot can think per move.
+		'''
+		time_limit = -1
+		while time_limit <= 0:
+
+			try:
+				time_limit = float(input("Milliseconds per move: "))
+			except:
+				print("No, you don't understand, please try again. Pick a number of milliseconds, like 1000.")
+			else:
+				if time_limit <= 0:
+					print("The robot can't think in negative time. Yet.")
+
+		return time_limit
 
 	def get_command(self):
 		
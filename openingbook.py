@@ -0,0 +1,249 @@
+'''
+    Opening book: the robot's answers to the first few positions of the game, worked out ahead of time.
+
+    The book is a file of (position, move, weight) entries, sorted by the canonical Zobrist hash of the position
+    (see transposition.canonical: a position with black to move is written down as its mirror with white to move,
+    so a position and its mirror are only in the book once). It's a .npy file memory-mapped when loaded,
+    so only the pages a lookup touches are ever read, and finding a position is a binary search.
+
+    A move is written as its starting square, its landing square and the squares it jumped over
+    (bitboard square numbers, see engine/bitboard.py, on the mirrored board if the position was mirrored),
+    which is enough to find it among the legal turns again.
+    The weight says how good the move is, or how often it was played, the more the better.
+
+    Books are made offline, from deep searches and/or self-play games (selfplay.py output):
+        python openingbook.py build --depth 5 --plies 6 --games results.jsonl --out book.npy
+        python openingbook.py show --book book.npy
+'''
+
+import argparse
+import json
+import os
+import random
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+import dame_ai as dai
+import dame as dm
+from engine import bitboard as bb
+from engine import transposition as tt
+
+
+ENTRY = np.dtype([('key', '<u8'), ('captured', '<u4'), ('weight', '<u2'), ('fro', 'u1'), ('to', 'u1')])
+
+# Where the game looks for a book
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.npy')
+
+PICKS = ('best', 'weighted')
+
+
+def turn_fields(turn: dm.Move, mirrored: bool = False):
+    '''
+        The (starting square, landing square, jumped over squares mask) a turn is written down as.
+        With mirrored, those of the turn on the mirrored board (see transposition.canonical).
+    '''
+    if mirrored:
+        turn = dm.mirror_move(turn)
+    (xf, yf), (xto, yto) = turn.path[0], turn.path[-1]
+    return bb.SQUARE_OF[xf][yf], bb.SQUARE_OF[xto][yto], sum(1 << bb.SQUARE_OF[x][y] for x, y in turn.captured)
+
+
+class OpeningBook:
+    '''
+        A book loaded from a file.
+
+        pick says which of the known moves of a position gets played:
+            'best':     the one with the highest weight (the first one written down if there's a tie)
+            'weighted': a random one, the chance of a move going with its weight
+    '''
+
+    def __init__(self, path: str = DEFAULT_PATH, pick: str = 'best', seed: int = None):
+        if pick not in PICKS:
+            raise ValueError(f"Unknown way to pick a move {pick!r}, pick one of {PICKS}.")
+
+        self.path = path
+        self.entries = np.load(path, mmap_mode='r')
+        if self.entries.dtype != ENTRY:
+            raise ValueError(f"{path} is not an opening book.")
+
+        self.keys = self.entries['key']
+        self.pick = pick
+        self.rng = random.Random(seed)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def moves(self, board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, for_white: bool):
+        '''
+            The (turn, weight) pairs the book knows for a position, heaviest first.
+            Moves that aren't legal on this board (the hash of another position) are left out.
+        '''
+        key, mirrored = tt.canonical(board, for_white)
+        key = np.uint64(key)
+        start = np.searchsorted(self.keys, key, side='left')
+        stop = np.searchsorted(self.keys, key, side='right')
+        if start == stop:
+            return []
+
+        legal = {turn_fields(turn, mirrored): turn for turn in dm.generate_turns(for_white, board, white_pieces, black_pieces)}
+        found = []
+        for entry in self.entries[start:stop]:
+            turn = legal.get((int(entry['fro']), int(entry['to']), int(entry['captured'])))
+            if turn is not None:
+                found.append((turn, int(entry['weight'])))
+
+        return sorted(found, key=lambda item: -item[1])
+
+    def choose(self, board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, for_white: bool):
+        '''
+            The move the book plays in a position, or None if it doesn't know the position.
+        '''
+        found = self.moves(board, white_pieces, black_pieces, for_white)
+        if not found:
+            return None
+
+        if self.pick == 'weighted':
+            return self.rng.choices([turn for turn, _ in found], weights=[weight for _, weight in found])[0]
+        return found[0][0]
+
+
+def default_book(pick: str = 'best'):
+    '''
+        The book next to the game (book.npy), or None if there's none.
+    '''
+    if os.path.exists(DEFAULT_PATH):
+        return OpeningBook(DEFAULT_PATH, pick)
+    return None
+
+
+def write_book(weights: dict, path: str):
+    '''
+        Writes a book from a {(key, fro, to, captured): weight} dict.
+    '''
+    entries = np.zeros(len(weights), dtype=ENTRY)
+    for i, ((key, fro, to, captured), weight) in enumerate(weights.items()):
+        entries[i] = (key, captured, min(weight, np.iinfo(np.uint16).max), fro, to)
+
+    entries = entries[np.argsort(entries['key'], kind='stable')]
+    with open(path, 'wb') as file: # np.save would add .npy to any other name
+        np.save(file, entries)
+
+
+def searched_moves(depth: int, plies: int, verbose: bool = False):
+    '''
+        Book moves found by searching depth moves deep, for both colours: for every position
+        the robot can meet in the first plies turns, if the robot's opponent plays anything
+        and the robot plays what the search says. Returns a {(key, fro, to, captured): weight} dict.
+    '''
+    weights = defaultdict(int)
+
+    for robot_white in (True, False):
+        game = dm.Dame()
+        robot = dai.Dame_AI(game, robot_white)
+        seen = set()
+
+        def walk(for_white, ply):
+            key, mirrored = tt.canonical(game.board, for_white)
+            if ply >= plies or (key, robot_white) in seen:
+                return
+            seen.add((key, robot_white))
+
+            if for_white == robot_white:
+                move, _ = robot.choose_move(depth)
+                if move is None:
+                    return
+                weights[(key, *turn_fields(move, mirrored))] += 1
+                if verbose:
+                    print(f"{dm.position_text(game.board, for_white)}: {dm.name[for_white]} plays "
+                          f"{dm.turn_name(move)}", file=sys.stderr)
+                turns = [move]
+            else:
+                turns = list(game.generate_turns(for_white))
+
+            for turn in turns:
+                undos = dm.make_turn(game.board, game.white_pieces, game.black_pieces, turn, for_white)
+                walk(not for_white, ply+1)
+                dm.unmake_turn(game.board, game.white_pieces, game.black_pieces, undos)
+
+        walk(True, 0)
+
+    return weights
+
+
+def played_moves(lines, plies: int):
+    '''
+        Book moves from selfplay.py games (lines of JSON): every robot move of the first plies turns
+        of a game counts once, the moves of the loser of a game don't count.
+        Returns a {(key, fro, to, captured): weight} dict.
+    '''
+    weights = defaultdict(int)
+
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+
+        game = dm.Dame()
+        for_white = True
+        for ply, written in enumerate(record['moves'][:plies]):
+            turn = next(turn for turn in game.generate_turns(for_white)
+                        if dm.turn_name(turn) == written)
+
+            loser = record['winner'] is not None and record['winner'] != record['white' if for_white else 'black']
+            if ply >= record.get('random_plies', 0) and not loser:
+                key, mirrored = tt.canonical(game.board, for_white)
+                weights[(key, *turn_fields(turn, mirrored))] += 1
+
+            dm.make_turn(game.board, game.white_pieces, game.black_pieces, turn, for_white)
+            for_white = not for_white
+
+    return weights
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Make or look at an opening book.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="make a book from searches and/or self-play games")
+    build.add_argument('--depth', type=int, default=4, help="how deep to search the book positions, 0 to not search")
+    build.add_argument('--plies', type=int, default=6, help="how many turns from the start the book goes")
+    build.add_argument('--games', nargs='*', default=[], help="selfplay.py JSONL files to learn from")
+    build.add_argument('--out', default=DEFAULT_PATH)
+    build.add_argument('--verbose', action='store_true')
+
+    show = commands.add_parser('show', help="list what the book knows of a position")
+    show.add_argument('--book', default=DEFAULT_PATH)
+    show.add_argument('--position', default=None, help="position like dame.read_position reads it, the start by default")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        weights = defaultdict(int)
+        if args.depth > 0:
+            for entry, weight in searched_moves(args.depth, args.plies, args.verbose).items():
+                weights[entry] += weight
+        for path in args.games:
+            with open(path) as file:
+                for entry, weight in played_moves(file, args.plies).items():
+                    weights[entry] += weight
+
+        write_book(weights, args.out)
+        print(f"Wrote {len(weights)} moves to {args.out}.")
+
+    else:
+        book = OpeningBook(args.book)
+        if args.position is None:
+            game = dm.Dame()
+            board, white_pieces, black_pieces, for_white = game.board, game.white_pieces, game.black_pieces, True
+        else:
+            board, white_pieces, black_pieces, for_white = dm.read_position(args.position)
+
+        print(f"{len(book)} moves in the book.")
+        for turn, weight in book.moves(board, white_pieces, black_pieces, for_white):
+            print(f"{dm.turn_name(turn)}: {weight}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+'''
+    Perft: counts every line of play down to some depth, to check the move generation and time it.
+
+    A line is a list of whole turns (jumps and all, see dame.Move), so perft(1) is the number of turns
+    the player to move has, perft(2) the number of (turn, answer) pairs, and so on.
+    Any move generator has to give exactly the counts in POSITIONS, and the number of positions
+    it goes through per second says how fast it is.
+
+    The tree can be walked in three ways, which have to agree:
+        'copy':     the way the game moves, dame.move on a fresh copy of the board for every turn
+        'make':     the way the robot searches, dame.make_turn / unmake_turn on a single board
+        'bitboard': bitboard.generate_turns straight on the bitboards, no board at all
+
+    Run it like:
+        python perft.py --depth 6                      (from the start)
+        python perft.py --depth 4 --position "B:WKd8,b4,h4,a3,g3,b2,h2,c1:Bb8,f8,a7,c7,d6,h6" --divide
+        python perft.py --check --depth 5 --method copy make bitboard
+'''
+
+import argparse
+import sys
+import time
+
+import dame as dm
+from engine import bitboard as bb
+
+
+START = "W:Wa3,c3,e3,g3,b2,d2,f2,h2,a1,c1,e1,g1:Bb8,d8,f8,h8,a7,c7,e7,g7,b6,d6,f6,h6"
+
+# Known-good counts: (what's special about the position, position, perft(1), perft(2), ...)
+# Checked against a move generator written separately, square by square.
+POSITIONS = [
+    ("start", START,
+     [7, 49, 302, 1469, 7361, 36768, 179740]),
+    ("forced jumps and chains", "W:Wb4,h4,a3,c3,g3,b2,d2,h2,c1,e1,g1:Bb8,d8,f8,h8,a7,c7,e7,b6,f6,e5,e3",
+     [1, 2, 10, 54, 258, 1317, 6600, 34543]),
+    ("a white super piece", "B:WKd8,b4,h4,a3,g3,b2,h2,c1:Bb8,f8,a7,c7,d6,h6",
+     [7, 23, 110, 446, 2111, 9051, 38676]),
+    ("super piece chains", "B:WKd8,a7,c7,e7,c5,a3,f2,h2,a1:Bb8,e5",
+     [1, 1, 2, 18, 32, 131, 195, 1296]),
+    ("a black super piece, lots of moves", "B:Wc5,e3,f2,h2,a1,e1,g1:Bb8,d8,f8,h8,a7,c7,e7,f6,h6,Kc1",
+     [11, 58, 292, 1528, 7694, 39343]),
+    ("promoted halfway through a jump", "B:Wd4,d2,h2,g1:Bb8,d8,f8,a7,g7,h6,c5,b2",
+     [1, 2, 18, 63, 607, 1641, 14176]),
+]
+
+
+def perft_copy(board, white_pieces, black_pieces, for_white: bool, depth: int):
+    '''
+        Counts the lines of play by moving pieces with dame.move on copies of the board.
+    '''
+    turns = list(dm.generate_turns(for_white, board, white_pieces, black_pieces))
+    if depth <= 1:
+        return len(turns) if depth == 1 else 1
+
+    count = 0
+    for turn in turns:
+        hyboard, hywhite, hyblack = dm.BoardState(board, white_pieces, black_pieces).copy()
+        for fro, to in zip(turn.path, turn.path[1:]):
+            dm.move(hyboard, hywhite, hyblack, fro, to, for_white)
+        count += perft_copy(hyboard, hywhite, hyblack, not for_white, depth-1)
+    return count
+
+
+def perft_make(board, white_pieces, black_pieces, for_white: bool, depth: int):
+    '''
+        Counts the lines of play by making and taking back the turns on one board.
+    '''
+    turns = list(dm.generate_turns(for_white, board, white_pieces, black_pieces))
+    if depth <= 1:
+        return len(turns) if depth == 1 else 1
+
+    count = 0
+    for turn in turns:
+        undos = dm.make_turn(board, white_pieces, black_pieces, turn, for_white)
+        count += perft_make(board, white_pieces, black_pieces, not for_white, depth-1)
+        dm.unmake_turn(board, white_pieces, black_pieces, undos)
+    return count
+
+
+def perft_bitboard(for_white: bool, wm: int, bm: int, wk: int, bk: int, depth: int):
+    '''
+        Counts the lines of play on the bitboards alone.
+    '''
+    turns = list(bb.generate_turns(for_white, wm, bm, wk, bk))
+    if depth <= 1:
+        return len(turns) if depth == 1 else 1
+
+    return sum(perft_bitboard(not for_white, *bb.play(for_white, wm, bm, wk, bk, *turn), depth-1)
+               for turn in turns)
+
+
+METHODS = ('copy', 'make', 'bitboard')
+
+
+def perft(position: str, depth: int, method: str = 'make'):
+    '''
+        Counts the lines of play of a position (as dame.read_position reads it) depth turns deep.
+    '''
+    board, white_pieces, black_pieces, for_white = dm.read_position(position)
+
+    if method == 'copy':
+        return perft_copy(board, white_pieces, black_pieces, for_white, depth)
+    if method == 'make':
+        return perft_make(board, white_pieces, black_pieces, for_white, depth)
+    if method == 'bitboard':
+        return perft_bitboard(for_white, *bb.from_board(board), depth)
+    raise ValueError(f"Unknown perft method {method!r}, pick one of {METHODS}.")
+
+
+def divide(position: str, depth: int, method: str = 'make'):
+    '''
+        perft split up by the first turn: a list of (turn, count) pairs, handy for finding where two generators differ.
+    '''
+    board, white_pieces, black_pieces, for_white = dm.read_position(position)
+
+    counts = []
+    for turn in dm.generate_turns(for_white, board, white_pieces, black_pieces):
+        undos = dm.make_turn(board, white_pieces, black_pieces, turn, for_white)
+        after = dm.position_text(board, not for_white)
+        dm.unmake_turn(board, white_pieces, black_pieces, undos)
+        counts.append((turn, perft(after, depth-1, method)))
+    return counts
+
+
+def timed(position: str, depth: int, method: str):
+    '''
+        Runs perft, returns the count and how many seconds it took.
+    '''
+    start = time.perf_counter()
+    count = perft(position, depth, method)
+    return count, time.perf_counter() - start
+
+
+def check(max_depth: int, methods: list = ('make',), verbose: bool = True):
+    '''
+        Compares every method with the known counts of POSITIONS, up to max_depth turns deep.
+        Returns True if everything matched.
+    '''
+    good = True
+    for about, position, counts in POSITIONS:
+        if verbose:
+            print(f"{about}: {position}")
+
+        for depth, expected in enumerate(counts[:max_depth], start=1):
+            for method in methods:
+                count, seconds = timed(position, depth, method)
+                good = good and count == expected
+                if verbose:
+                    print(f"    {method:>8} perft({depth}) = {count:>8}  {'ok' if count == expected else f'WRONG, should be {expected}'}"
+                          f"  {count / max(seconds, 1e-9):>12,.0f} positions/s")
+    return good
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Count the lines of play of a position, check and time the move generation.")
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--position', default=START, help="position like dame.read_position reads it, the start by default")
+    parser.add_argument('--method', nargs='+', choices=METHODS, default=['make'])
+    parser.add_argument('--divide', action='store_true', help="show the count after every first turn")
+    parser.add_argument('--check', action='store_true', help="compare with the known counts of the test positions instead")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        good = check(args.depth, args.method)
+        print("All good." if good else "Some counts are WRONG.")
+        sys.exit(0 if good else 1)
+
+    try:
+        dm.read_position(args.position)
+    except ValueError as error:
+        parser.error(str(error))
+
+    for method in args.method:
+        if args.divide:
+            for turn, count in divide(args.position, args.depth, method):
+                print(f"{dm.turn_name(turn)}: {count}")
+
+        count, seconds = timed(args.position, args.depth, method)
+        print(f"{method}: perft({args.depth}) = {count} in {seconds:.3f}s, {count / max(seconds, 1e-9):,.0f} positions/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+'''
+    Game records: the positions of lots of games in one binary file, for training and analysis.
+
+    Every position is a record of RECORD (24 bytes): the position packed into four bitboards
+    (see bitboard.pack_boards), the number of the game it's from, how many turns into the game it is,
+    who's to move, and how the game ended (1 if white won, -1 if black won, 0 for a draw).
+
+    The file is a 16 byte header and then the records one after the other, nothing else,
+    so more games can be appended to it at any time and the whole file can be memory-mapped
+    as one array, without reading it.
+
+        python records.py convert results.jsonl --out games.rec      (games from selfplay.py)
+        python records.py show games.rec --positions 5
+'''
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+import dame as dm
+from engine import bitboard as bb
+
+
+RECORD = np.dtype([('position', '<u4', (4,)), ('game', '<u4'), ('ply', '<u2'),
+                   ('white_to_move', 'u1'), ('result', 'i1')])
+
+MAGIC = b'DAMEREC1'
+HEADER = np.dtype([('magic', 'S8'), ('record_size', '<u4'), ('reserved', '<u4')])
+
+RESULTS = {'white': 1, 'black': -1, None: 0}
+
+
+def game_records(moves: list, winner_colour: str = None, game: int = 0):
+    '''
+        The records of every position of a game played from the start: the one before every move,
+        and the one after the last. moves are dame.Move turns or their names (dame.turn_name),
+        winner_colour is 'white', 'black' or None for a draw.
+    '''
+    dame = dm.Dame()
+    for_white = True
+    boards, sides = [dame.board.copy()], [for_white]
+
+    for written in moves:
+        turns = list(dame.generate_turns(for_white))
+        turn = next((turn for turn in turns if turn == written or dm.turn_name(turn) == written), None)
+        if turn is None:
+            raise ValueError(f"{written} can't be played after {dm.position_text(dame.board, for_white)}")
+
+        dm.make_turn(dame.board, dame.white_pieces, dame.black_pieces, turn, for_white)
+        for_white = not for_white
+        boards.append(dame.board.copy())
+        sides.append(for_white)
+
+    records = np.zeros(len(boards), dtype=RECORD)
+    records['position'] = bb.pack_boards(np.array(boards))
+    records['game'] = game
+    records['ply'] = np.arange(len(boards))
+    records['white_to_move'] = sides
+    records['result'] = RESULTS[winner_colour]
+    return records
+
+
+def append(path: str, records: np.array):
+    '''
+        Adds records to the end of a records file, making the file if it's not there yet.
+    '''
+    records = np.asarray(records, dtype=RECORD)
+
+    with open(path, 'ab') as file:
+        if file.tell() == 0:
+            np.array([(MAGIC, RECORD.itemsize, 0)], dtype=HEADER).tofile(file)
+        else:
+            _check_header(path)
+        records.tofile(file)
+
+
+def load(path: str):
+    '''
+        The records of a file as a read-only memory-mapped array of RECORD.
+    '''
+    _check_header(path)
+    if os.path.getsize(path) == HEADER.itemsize: # An empty memory map can't be made
+        return np.zeros(0, dtype=RECORD)
+
+    return np.memmap(path, dtype=RECORD, mode='r', offset=HEADER.itemsize)
+
+
+def _check_header(path: str):
+    header = np.fromfile(path, dtype=HEADER, count=1)
+    if len(header) == 0 or header[0]['magic'] != MAGIC or header[0]['record_size'] != RECORD.itemsize:
+        raise ValueError(f"{path} is not a game records file.")
+    if (os.path.getsize(path) - HEADER.itemsize) % RECORD.itemsize:
+        raise ValueError(f"{path} ends halfway through a record.")
+
+
+def boards(records: np.array):
+    '''
+        The (N, 8, 8) boards of records.
+    '''
+    return bb.unpack_boards(records['position'])
+
+
+def position(record):
+    '''
+        The board, white pieces, black pieces and whether white is to move of one record,
+        the way dame.read_position gives them.
+    '''
+    board, white_pieces, black_pieces = dm.BoardState(bb.unpack_boards(record['position'][None])[0])
+    return board, white_pieces, black_pieces, bool(record['white_to_move'])
+
+
+def next_game(path: str):
+    '''
+        The first game number not used in a records file yet (0 if there's no file).
+    '''
+    if not os.path.exists(path):
+        return 0
+    records = load(path)
+    return int(records['game'].max()) + 1 if len(records) else 0
+
+
+def convert(lines, path: str):
+    '''
+        Appends the games of selfplay.py (lines of JSON) to a records file, returns how many positions it added.
+        The games are numbered on from the ones already in the file.
+    '''
+    first = next_game(path)
+    added = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        game = json.loads(line)
+        records = game_records(game['moves'], game['winner_colour'], first + game['game'])
+        append(path, records)
+        added += len(records)
+    return added
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Make or look at a file of game records.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    make = commands.add_parser('convert', help="add selfplay.py games to a records file")
+    make.add_argument('games', nargs='+', help="selfplay.py JSONL files, - for the console")
+    make.add_argument('--out', required=True)
+
+    show = commands.add_parser('show', help="say what's in a records file")
+    show.add_argument('path')
+    show.add_argument('--positions', type=int, default=0, help="also write down the first this many positions")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        added = 0
+        for path in args.games:
+            if path == '-':
+                added += convert(sys.stdin, args.out)
+            else:
+                with open(path) as file:
+                    added += convert(file, args.out)
+        print(f"Added {added} positions to {args.out}.")
+
+    else:
+        records = load(args.path)
+        games = records[records['ply'] == 0]
+        results = {result: int((games['result'] == value).sum()) for result, value in RESULTS.items()}
+        print(f"{len(records)} positions from {len(games)} games: "
+              f"white won {results['white']}, black won {results['black']}, {results[None]} draws.")
+
+        for record in records[:args.positions]:
+            board, _, _, white_to_move = position(record)
+            print(f"game {record['game']} turn {record['ply']}: {dm.position_text(board, white_to_move)}")
+
+
+if __name__ == "__main__":
+    main()
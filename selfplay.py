@@ -0,0 +1,201 @@
+'''
+    Headless self-play: two robot settings play lots of games against each other, nobody has to type anything.
+
+    A robot setting is how deep it looks or how long it thinks, written like "depth=3" or "time=250" (milliseconds),
+    maybe followed by how many positions it may play out captures for, like "depth=3,quiescence=0".
+    The games are played in a pool of worker processes, and every finished game is written
+    as a line of JSON to the output, as soon as it's done (so not in game order):
+
+        {"game": 0, "white": "a", "black": "b", "a": "depth=3", "b": "time=250", "random_plies": 4,
+         "winner": "a", "winner_colour": "white", "plies": 57, "moves": ["c3-d4", ...],
+         "nodes": {"a": 123456, "b": 98765}, "move_ms": [12.5, ...], "seconds": 4.2,
+         "pieces": {"white": 5, "black": 0}}
+
+    With stats, every record also has "stats": the SearchStats.as_dict() of every move the robots made.
+    With records, the positions of the games also go to a binary game records file (see records.py).
+
+    A winner of null is a draw: nobody won in max_plies turns (pieces tells who was ahead).
+    The robots never pick randomly, so every game would be the same. To get different games,
+    the first few turns (random_plies) are picked at random, from a seed that depends on the game's number.
+
+    Run it like:
+        python selfplay.py --a depth=3 --b depth=2 --games 100 --workers 4 --out results.jsonl
+'''
+
+import argparse
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import dame_ai as dai
+import dame as dm
+from engine import transposition as tt
+import openingbook
+import records
+import tablebase as tb
+
+
+def parse_setting(setting: str):
+    '''
+        Turns "depth=3" or "time=250" into the keyword arguments of Dame_AI.take_turn.
+        A ",quiescence=16" after it sets how many positions the robot may play out captures for
+        (0 for none), which comes back as 'quiescence' in the dict.
+    '''
+    turn, *options = setting.split(',')
+    kind, _, value = turn.partition('=')
+    try:
+        if kind not in ('depth', 'time'):
+            raise ValueError
+        parsed = {'depth': int(value)} if kind == 'depth' else {'time_limit': float(value)}
+        for option in options:
+            name, _, value = option.partition('=')
+            if name != 'quiescence':
+                raise ValueError
+            parsed['quiescence'] = int(value)
+    except ValueError:
+        raise ValueError(f"Can't understand the robot setting {setting!r}, it should look like depth=3 or time=250"
+                         f" (maybe with ,quiescence=16 after it).") from None
+    return parsed
+
+
+def play_game(number: int, a: str, b: str, a_is_white: bool = True, max_plies: int = 300,
+              random_plies: int = 4, seed: int = 0, table_mb: float = 8, stats: bool = False, book: str = None,
+              tablebase: str = None):
+    '''
+        Plays a game between robot settings a and b, returns what happened as a dict (see the top of the file).
+        Both robots play from the opening book file book, and use the tablebase directory tablebase, if given.
+    '''
+    settings = {'a': parse_setting(a), 'b': parse_setting(b)}
+    quiescence = {player: setting.pop('quiescence', dai.QUIESCENCE_NODES) for player, setting in settings.items()}
+    colour_of = {True: 'a' if a_is_white else 'b', False: 'b' if a_is_white else 'a'}
+
+    game = dm.Dame()
+    opening_book = openingbook.OpeningBook(book) if book is not None else None
+    endgames = tb.Tablebase(tablebase) if tablebase is not None else None
+    robots = {for_white: dai.Dame_AI(game, for_white, tt.TranspositionTable(table_mb), stats=stats,
+                                     book=opening_book, tablebase=endgames, quiescence=quiescence[colour_of[for_white]])
+              for for_white in (True, False)}
+    rng = random.Random(f"{seed}/{number}")
+
+    moves, move_ms, move_stats = [], [], []
+    nodes = {'a': 0, 'b': 0}
+    winner = None
+    for_white = True
+    start = time.perf_counter()
+
+    for ply in range(max_plies):
+
+        if game.is_game_over(for_white, verbose=False):
+            winner = colour_of[not for_white]
+            break
+
+        if ply < random_plies: # Opening by dice
+            turn = rng.choice(list(game.generate_turns(for_white)))
+            for fro, to in zip(turn.path, turn.path[1:]):
+                game.move(fro, to, for_white)
+            move_ms.append(0.0)
+
+        else:
+            robot = robots[for_white]
+            thinking = time.perf_counter()
+            turn = robot.take_turn(**settings[colour_of[for_white]])
+            move_ms.append(round((time.perf_counter() - thinking) * 1000, 3))
+            nodes[colour_of[for_white]] += robot.nodes
+            if stats:
+                move_stats.append(robot.stats.as_dict())
+
+        moves.append(dm.turn_name(turn))
+        for_white = not for_white
+
+    result = {
+        'game': number,
+        'white': colour_of[True],
+        'black': colour_of[False],
+        'a': a,
+        'b': b,
+        'random_plies': random_plies,
+        'winner': winner,
+        'winner_colour': None if winner is None else dm.name[winner == colour_of[True]].lower(),
+        'plies': len(moves),
+        'moves': moves,
+        'nodes': nodes,
+        'move_ms': move_ms,
+        'seconds': round(time.perf_counter() - start, 3),
+        'pieces': {'white': len(game.white_pieces), 'black': len(game.black_pieces)},
+    }
+    if stats:
+        result['stats'] = move_stats
+    return result
+
+
+def run(a: str, b: str, games: int, out, workers: int = 1, alternate: bool = True, records_path: str = None,
+        **kwargs):
+    '''
+        Plays games games between robot settings a and b in a pool of workers processes,
+        writing every finished game to the file out as a line of JSON.
+        With alternate, a plays black in every other game, otherwise always white.
+        With a records_path, the positions of every game are also added to that game records file (see records.py).
+        The other keyword arguments go to play_game.
+
+        Returns how many games a won, b won and how many were draws.
+    '''
+    parse_setting(a), parse_setting(b) # Complain now, not in a worker
+
+    score = {'a': 0, 'b': 0, None: 0}
+    first_game = records.next_game(records_path) if records_path is not None else 0
+    with ProcessPoolExecutor(workers) as pool:
+        tasks = [pool.submit(play_game, number, a, b, not (alternate and number % 2), **kwargs)
+                 for number in range(games)]
+
+        for task in as_completed(tasks):
+            result = task.result()
+            score[result['winner']] += 1
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+            if records_path is not None:
+                records.append(records_path, records.game_records(result['moves'], result['winner_colour'],
+                                                                  first_game + result['game']))
+
+    return score['a'], score['b'], score[None]
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Let two robot settings play dame against each other.")
+    parser.add_argument('--a', required=True, help="first robot, like depth=3 or time=250 (milliseconds per move), maybe with ,quiescence=0 after it")
+    parser.add_argument('--b', required=True, help="second robot, same as --a")
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=1, help="number of processes playing games at once")
+    parser.add_argument('--out', default='-', help="JSONL file to write the games to, - for the console")
+    parser.add_argument('--same-colours', action='store_true', help="a always plays white instead of taking turns")
+    parser.add_argument('--max-plies', type=int, default=300, help="turns after which the game is a draw")
+    parser.add_argument('--random-plies', type=int, default=4, help="turns picked at random at the start")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--table-mb', type=float, default=8, help="size of each robot's transposition table")
+    parser.add_argument('--stats', action='store_true', help="write down what every search of the robots did")
+    parser.add_argument('--book', default=None, help="opening book file for both robots")
+    parser.add_argument('--tablebase', default=None, help="endgame tablebase directory for both robots")
+    parser.add_argument('--records', default=None, help="game records file to add the positions of the games to")
+    args = parser.parse_args(argv)
+
+    try:
+        parse_setting(args.a), parse_setting(args.b)
+    except ValueError as error:
+        parser.error(str(error))
+
+    out = sys.stdout if args.out == '-' else open(args.out, 'a')
+    try:
+        wins_a, wins_b, draws = run(args.a, args.b, args.games, out, args.workers, not args.same_colours, args.records,
+                                    max_plies=args.max_plies, random_plies=args.random_plies,
+                                    seed=args.seed, table_mb=args.table_mb, stats=args.stats, book=args.book,
+                                    tablebase=args.tablebase)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"a ({args.a}) won {wins_a}, b ({args.b}) won {wins_b}, {draws} draws.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
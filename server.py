@@ -0,0 +1,270 @@
+'''
+    Engine server: one long-running process that front ends ask for the robot's moves.
+
+    The searching is done by a pool of worker processes that stay up between requests, each with its own
+    robots, transposition table, opening book and tablebase, so nothing is loaded or worked out twice.
+    The server itself runs on asyncio and takes any number of connections at once, over TCP or a Unix socket.
+
+    The protocol is lines of JSON, one request per line, answered by one line each:
+
+        {"id": 1, "position": "W:Wc3,e3:Bd6,f6", "depth": 3}    (or "time": 250 for milliseconds per move)
+        {"id": 1, "move": "c3-d4", "path": ["c3", "d4"], "position": "B:Wd4,e3:Bd6,f6", "nodes": 1234, "ms": 12.5}
+
+    "move" is null if the player to move has no move (they've lost). Other requests:
+
+        {"id": 2, "op": "ping"}     ->  {"id": 2, "pong": true}
+        {"id": 3, "op": "stats"}    ->  {"id": 3, "requests": 42, "errors": 0, "workers": 2, "uptime": 100.0}
+
+    A request that goes wrong is answered with {"id": ..., "error": "what went wrong"}, so is one asking for
+    a depth above the server's --max-depth or a time above its --max-time (one search can't hold up a worker forever).
+    The id is optional and only sent back. Requests on one connection are worked on at the same time,
+    so the answers can come in a different order.
+
+        python server.py --port 8765 --workers 2
+        python server.py --unix /tmp/dame.sock --book book.npy --tablebase tablebases
+'''
+
+import argparse
+import asyncio
+import json
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import dame_ai as dai
+import dame as dm
+from engine import transposition as tt
+import openingbook
+import tablebase as tb
+
+
+# The most a move request may ask for, unless the server is started with other limits
+MAX_DEPTH = 10
+MAX_TIME = 10_000 # Milliseconds
+
+# What a worker process keeps between requests: a robot for each colour, sharing one table
+_robots = {}
+
+def _start_engine(table_mb:float, book:str, tablebase:str):
+    '''
+        Loads everything a worker process needs once, when it starts.
+    '''
+    table = tt.TranspositionTable(table_mb)
+    opening_book = openingbook.OpeningBook(book) if book is not None else None
+    endgames = tb.Tablebase(tablebase) if tablebase is not None else None
+
+    for for_white in (True, False):
+        _robots[for_white] = dai.Dame_AI(None, for_white, table, book=opening_book, tablebase=endgames)
+
+def _find_move(position:str, depth:int, time_limit:float):
+    '''
+        Runs in a worker process: the robot's move in a position, as the answer to send back.
+    '''
+    board, white_pieces, black_pieces, for_white = dm.read_position(position)
+    robot = _robots[for_white]
+    robot.game = dm.Dame(board, white_pieces, black_pieces)
+
+    if not robot.list_valid_moves():
+        return {'move': None, 'path': [], 'position': position, 'nodes': 0, 'ms': 0.0}
+
+    start = time.perf_counter()
+    move = robot.take_turn(depth=depth, time_limit=time_limit)
+    return {
+        'move': dm.turn_name(move),
+        'path': [dm.square_name(square) for square in move.path],
+        'position': dm.position_text(robot.game.board, not for_white),
+        'nodes': robot.nodes,
+        'ms': round((time.perf_counter() - start) * 1000, 3),
+    }
+
+
+class EngineServer:
+    '''
+        The asyncio side of the server: reads requests, hands the searches to the worker pool, writes the answers.
+    '''
+
+    def __init__(self, workers:int = 1, table_mb:float = 32, book:str = None, tablebase:str = None,
+                 max_depth:int = MAX_DEPTH, max_time:float = MAX_TIME):
+        '''
+            Move requests may ask for at most max_depth moves ahead or max_time milliseconds of thinking.
+        '''
+        if not 0 <= max_depth <= dai.MAX_DEPTH:
+            raise ValueError(f"The depth limit has to be between 0 and {dai.MAX_DEPTH}.")
+
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_time = max_time
+        self.pool = ProcessPoolExecutor(workers, initializer=_start_engine, initargs=(table_mb, book, tablebase))
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    async def answer(self, request:dict):
+        '''
+            The answer to a request, without its id.
+        '''
+        op = request.get('op', 'move')
+
+        if op == 'ping':
+            return {'pong': True}
+
+        if op == 'stats':
+            return {'requests': self.requests, 'errors': self.errors, 'workers': self.workers,
+                    'uptime': round(time.time() - self.started, 3)}
+
+        if op != 'move':
+            raise ValueError(f"Unknown op {op!r}")
+
+        position, depth, time_limit = request.get('position'), request.get('depth'), request.get('time')
+        if not isinstance(position, str):
+            raise ValueError("A move request needs a position.")
+        dm.read_position(position) # Complain here rather than in a worker
+        if (depth is None) == (time_limit is None):
+            raise ValueError("A move request needs either a depth or a time, not both.")
+
+        if depth is not None:
+            depth = int(depth)
+            if not 0 <= depth <= self.max_depth:
+                raise ValueError(f"The depth has to be between 0 and {self.max_depth}.")
+        else:
+            time_limit = float(time_limit)
+            if not 0 < time_limit <= self.max_time: # Also keeps out nan
+                raise ValueError(f"The time has to be more than 0 and at most {self.max_time:g} milliseconds.")
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, _find_move, position, depth, time_limit)
+
+    async def respond(self, line:bytes, writer:asyncio.StreamWriter, lock:asyncio.Lock):
+        '''
+            Answers one line of a connection.
+        '''
+        self.requests += 1
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A request has to be a JSON object.")
+            response = await self.answer(request)
+        except Exception as error:
+            self.errors += 1
+            response = {'error': str(error) or type(error).__name__}
+
+        if 'id' in request:
+            response = {'id': request['id'], **response}
+
+        async with lock: # One answer at a time, so lines don't get mixed up
+            writer.write((json.dumps(response) + '\n').encode())
+            await writer.drain()
+
+    async def handle(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        '''
+            Serves a connection until the other side closes it.
+        '''
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self.respond(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host:str = '127.0.0.1', port:int = 8765, unix:str = None, ready = None):
+        '''
+            Serves forever, on a Unix socket if one is given, on TCP otherwise.
+            ready (an asyncio.Event) is set once connections are taken.
+        '''
+        if unix is not None:
+            server = await asyncio.start_unix_server(self.handle, path=unix)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+
+        async with server:
+            if ready is not None:
+                ready.set()
+            await server.serve_forever()
+
+
+class Client:
+    '''
+        A plain (blocking) connection to an engine server, for front ends that don't run asyncio.
+    '''
+
+    def __init__(self, host:str = '127.0.0.1', port:int = 8765, unix:str = None):
+        if unix is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(unix)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.file = self.socket.makefile('rwb')
+        self.next_id = 0
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def request(self, **request):
+        '''
+            Sends a request and waits for its answer. Raises RuntimeError if the server couldn't answer it.
+        '''
+        self.next_id += 1
+        request['id'] = self.next_id
+        self.file.write((json.dumps(request) + '\n').encode())
+        self.file.flush()
+
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The engine server closed the connection.")
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def move(self, position:str, depth:int = None, time_limit:float = None):
+        '''
+            The robot's move in a position (as dame.position_text writes it), see the top of the file for the answer.
+        '''
+        return self.request(position=position, depth=depth, time=time_limit)
+
+
+def main(argv:list = None):
+    parser = argparse.ArgumentParser(description="Run the robot as a server that front ends can ask for moves.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help="serve on this Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=1, help="number of searches that can run at once")
+    parser.add_argument('--table-mb', type=float, default=32, help="size of each worker's transposition table")
+    parser.add_argument('--book', default=None, help="opening book file")
+    parser.add_argument('--tablebase', default=None, help="endgame tablebase directory")
+    parser.add_argument('--max-depth', type=int, default=MAX_DEPTH, help="deepest search a request may ask for")
+    parser.add_argument('--max-time', type=float, default=MAX_TIME, help="most milliseconds a request may ask for")
+    args = parser.parse_args(argv)
+
+    server = EngineServer(args.workers, args.table_mb, args.book, args.tablebase, args.max_depth, args.max_time)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
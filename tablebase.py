@@ -0,0 +1,377 @@
+'''
+    Endgame tablebases: the exact outcome of every position with only a few pieces left.
+
+    The pieces on the board are a material signature, how many (white men, black men, white kings, black kings)
+    there are. For every signature with up to N pieces, every way of putting those pieces on the 32 dark squares
+    is numbered (see index), and a file holds one byte per position and player to move:
+
+        0:      a draw (nobody can force a win)
+        d + 1:  the game ends in d more turns if both play their best. d is odd if the player to move wins,
+                even if they lose (0: they have no move right now).
+
+    The files are made offline by retrograde analysis, backwards from the positions where a player has no move:
+    a position is won in d+1 turns if some move leads to a position lost in d, and lost in d+1 turns
+    if every move leads to a won position, the slowest of which is won in d. Whatever is left at the end is a draw.
+    A turn either stays in the same signature or leads to one with fewer pieces or fewer men (jumps, promotions),
+    so the signatures are worked out from the smallest up, and only the moves inside a signature need solving.
+
+    At runtime the files are memory-mapped, and the robot's search takes their scores as exact (see Tablebase).
+
+        python tablebase.py build --pieces 4 --out tablebases
+        python tablebase.py probe --position "W:WKc3:Bd6,Kf8"
+'''
+
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+from engine import bitboard as bb
+from engine.search import WIN # Scores the search gets for won positions: WIN - turns until the end
+
+
+# Where the game looks for the files
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases')
+
+
+def signatures(pieces: int):
+    '''
+        Every material signature with both colours on the board and at most pieces pieces,
+        in the order they can be worked out in (fewer pieces first, then fewer men).
+    '''
+    found = []
+    for total in range(2, pieces + 1):
+        for wm in range(total + 1):
+            for bm in range(total + 1 - wm):
+                for wk in range(total + 1 - wm - bm):
+                    bk = total - wm - bm - wk
+                    if wm + wk > 0 and bm + bk > 0:
+                        found.append((wm, bm, wk, bk))
+    return sorted(found, key=lambda signature: (sum(signature), signature[0] + signature[1]))
+
+
+def size(signature: tuple):
+    '''
+        How many ways the pieces of a signature can be put on the board.
+    '''
+    free, count = 32, 1
+    for pieces in signature:
+        count *= comb(free, pieces)
+        free -= pieces
+    return count
+
+
+def file_name(signature: tuple):
+    '''
+        The file of a signature, like 1102.npy for a white man, a black man, and two black kings.
+    '''
+    return ''.join(map(str, signature)) + '.npy'
+
+
+def index(groups: tuple):
+    '''
+        The number of a position among the positions of its signature.
+        groups is the (white men, black men, white kings, black kings) lists of squares, each sorted.
+
+        Every group is numbered as a combination (colex order) of the squares the groups before it left free,
+        and those numbers are put together as digits of a mixed radix number.
+    '''
+    number, radix, free = 0, 1, 32
+    taken = []
+    for group in groups:
+        rank = 0
+        for i, square in enumerate(group, start=1):
+            rank += comb(square - sum(1 for t in taken if t < square), i)
+        number += rank * radix
+        radix *= comb(free, len(group))
+        free -= len(group)
+        taken.extend(group)
+    return number
+
+
+def groups_of(wm: int, bm: int, wk: int, bk: int):
+    '''
+        The squares of every piece kind of a position, as index takes them.
+    '''
+    return bb.squares(wm), bb.squares(bm), bb.squares(wk), bb.squares(bk)
+
+
+def positions(signature: tuple):
+    '''
+        Yields every (wm, bm, wk, bk) bitboard position of a signature.
+    '''
+    def place(kinds, free):
+        if not kinds:
+            yield ()
+            return
+        for group in combinations(free, kinds[0]):
+            rest = [square for square in free if square not in group]
+            for others in place(kinds[1:], rest):
+                yield (sum(1 << square for square in group),) + others
+
+    yield from place(signature, list(range(32)))
+
+
+class Tablebase:
+    '''
+        The tablebase files of a directory, memory-mapped as they're needed.
+    '''
+
+    def __init__(self, directory: str = DEFAULT_DIR):
+        self.directory = directory
+        self.tables = {}
+
+        # The biggest piece count every signature of which has a file
+        self.pieces = 1
+        while all(os.path.exists(os.path.join(directory, file_name(signature)))
+                  for signature in signatures(self.pieces + 1) if sum(signature) == self.pieces + 1):
+            self.pieces += 1
+            if self.pieces == 32:
+                break
+
+    def table(self, signature: tuple):
+        '''
+            The (2, size) array of a signature, [1] for white to move, [0] for black.
+        '''
+        table = self.tables.get(signature)
+        if table is None:
+            table = self.tables[signature] = np.load(os.path.join(self.directory, file_name(signature)), mmap_mode='r')
+        return table
+
+    def probe_bitboards(self, for_white: bool, wm: int, bm: int, wk: int, bk: int):
+        '''
+            The byte of a position (see the top of the file), or None if it's not in the tablebase.
+        '''
+        if not (wm | wk):
+            return 1 if for_white else None # No pieces, no moves (white would've already lost)
+        if not (bm | bk):
+            return None if for_white else 1
+
+        groups = groups_of(wm, bm, wk, bk)
+        signature = tuple(map(len, groups))
+        if sum(signature) > self.pieces:
+            return None
+        return int(self.table(signature)[int(for_white), index(groups)])
+
+    def probe(self, board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, for_white: bool):
+        '''
+            Like probe_bitboards, for a board. Returns None right away if there are too many pieces.
+        '''
+        if len(white_pieces) + len(black_pieces) > self.pieces:
+            return None
+
+        return self.probe_bitboards(for_white, *bb.bitboards(board, white_pieces, black_pieces))
+
+    def score_bitboards(self, for_white: bool, wm: int, bm: int, wk: int, bk: int):
+        '''
+            The exact score of a position for the player to move, as the search uses it, or None if it's not known:
+            WIN - turns left if they win, -(WIN - turns left) if they lose, 0 for a draw.
+        '''
+        found = self.probe_bitboards(for_white, wm, bm, wk, bk)
+        if found is None:
+            return None
+        return describe_score(found)
+
+    def score(self, board: np.array, white_pieces: bb.Pieces, black_pieces: bb.Pieces, for_white: bool):
+        '''
+            Like score_bitboards, for a board.
+        '''
+        if len(white_pieces) + len(black_pieces) > self.pieces:
+            return None
+
+        return self.score_bitboards(for_white, *bb.bitboards(board, white_pieces, black_pieces))
+
+
+def default_tablebase():
+    '''
+        The tablebase next to the game (the tablebases directory), or None if there's none.
+    '''
+    if os.path.isdir(DEFAULT_DIR):
+        return Tablebase(DEFAULT_DIR)
+    return None
+
+
+def describe_score(byte: int):
+    '''
+        The search score of a tablebase byte.
+    '''
+    if byte == 0:
+        return 0
+    turns = byte - 1
+    return WIN - turns if turns % 2 else -(WIN - turns)
+
+
+def describe(byte: int):
+    '''
+        A tablebase byte in words.
+    '''
+    if byte is None:
+        return "not in the tablebase"
+    if byte == 0:
+        return "draw"
+    turns = byte - 1
+    return f"{'win' if turns % 2 else 'loss'} in {turns} turns"
+
+
+def solve(signature: tuple, known, verbose: bool = False):
+    '''
+        Works out the (2, size) table of a signature by retrograde analysis.
+        known(for_white, wm, bm, wk, bk) gives the byte of a position of an earlier signature.
+    '''
+    count = size(signature)
+    total = 2 * count # Position number: for_white * count + index
+
+    # Forward: what every position's moves lead to
+    moves = np.zeros(total, dtype=np.int32)    # Moves inside the signature that aren't settled yet
+    sources, targets = [], []                    # The moves inside the signature
+    outside_win = np.full(total, -1)             # Fewest turns to win through a move leaving the signature
+    outside_all_lost = np.ones(total, dtype=bool) # Every move leaving the signature leads to a win of the other player
+    outside_longest = np.zeros(total, dtype=np.int32)
+
+    start = time.perf_counter()
+    for wm, bm, wk, bk in positions(signature):
+        number = index(groups_of(wm, bm, wk, bk))
+
+        for for_white in (True, False):
+            here = int(for_white) * count + number
+            for turn in bb.generate_turns(for_white, wm, bm, wk, bk):
+                after = bb.play(for_white, wm, bm, wk, bk, *turn)
+                after_groups = groups_of(*after)
+
+                if tuple(map(len, after_groups)) == signature:
+                    sources.append(here)
+                    targets.append(int(not for_white) * count + index(after_groups))
+                    moves[here] += 1
+                    continue
+
+                byte = known(not for_white, *after)
+                if byte == 0: # A draw
+                    outside_all_lost[here] = False
+                elif (byte - 1) % 2 == 0: # The other player loses
+                    win = byte # In (byte - 1) + 1 turns
+                    outside_win[here] = win if outside_win[here] < 0 else min(outside_win[here], win)
+                    outside_all_lost[here] = False
+                else:
+                    outside_longest[here] = max(outside_longest[here], byte - 1)
+
+    if verbose:
+        print(f"  {signature}: {total} positions, {len(sources)} moves inside, listed in {time.perf_counter() - start:.1f}s",
+              file=sys.stderr)
+
+    # Backward: who can get into every position
+    sources, targets = np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+    order = np.argsort(targets, kind='stable')
+    predecessors = sources[order]
+    first = np.searchsorted(targets[order], np.arange(total + 1))
+
+    table = np.zeros(total, dtype=np.uint8)
+    settled = np.zeros(total, dtype=bool)
+    buckets = defaultdict(list) # turns left: [(position, won)]
+
+    for here in range(total):
+        if outside_win[here] >= 0:
+            buckets[int(outside_win[here])].append((here, True))
+        elif moves[here] == 0 and outside_all_lost[here]:
+            # Every move leaves the signature and loses (a lost position is at least 1 turn from the end),
+            # or there is no move at all
+            buckets[int(outside_longest[here]) + 1 if outside_longest[here] > 0 else 0].append((here, False))
+
+    turns = 0
+    while buckets:
+        for here, won in buckets.pop(turns, []):
+            if settled[here]:
+                continue
+            settled[here] = True
+            if turns + 1 > 255:
+                raise ValueError(f"{signature} has positions {turns} turns from the end, that doesn't fit in a byte.")
+            table[here] = turns + 1
+
+            for before in predecessors[first[here]:first[here+1]]:
+                if settled[before]:
+                    continue
+                if not won: # Moving here wins
+                    buckets[turns + 1].append((before, True))
+                else:
+                    moves[before] -= 1
+                    if moves[before] == 0 and outside_all_lost[before] and outside_win[before] < 0:
+                        buckets[max(turns, int(outside_longest[before])) + 1].append((before, False))
+        turns += 1
+
+    return table.reshape(2, count) # [1]: white to move, as the position numbers are for_white * count + index
+
+
+def build(pieces: int, directory: str = DEFAULT_DIR, verbose: bool = False):
+    '''
+        Works out and writes the files of every signature with up to pieces pieces, skipping the ones already there.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    tablebase = Tablebase(directory)
+    solved = {}
+
+    def known(for_white, wm, bm, wk, bk):
+        if not (wm | wk):
+            return 1 if for_white else None
+        if not (bm | bk):
+            return None if for_white else 1
+        signature = (wm.bit_count(), bm.bit_count(), wk.bit_count(), bk.bit_count())
+        table = solved.get(signature)
+        if table is None:
+            table = tablebase.table(signature)
+        return int(table[int(for_white), index(groups_of(wm, bm, wk, bk))])
+
+    for signature in signatures(pieces):
+        path = os.path.join(directory, file_name(signature))
+        if os.path.exists(path):
+            continue
+
+        start = time.perf_counter()
+        solved[signature] = solve(signature, known, verbose)
+        with open(path, 'wb') as file:
+            np.save(file, solved[signature])
+
+        if verbose:
+            table = solved[signature]
+            decided = table[table > 0]
+            print(f"{signature}: {np.count_nonzero(decided % 2 == 0)} wins, {np.count_nonzero(decided % 2 == 1)} losses, "
+                  f"{np.count_nonzero(table == 0)} draws, longest {int(table.max()) - 1} turns, "
+                  f"{time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+def main(argv: list = None):
+    import dame as dm
+
+    parser = argparse.ArgumentParser(description="Make or ask the endgame tablebases.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    make = commands.add_parser('build', help="work out every position with up to some pieces")
+    make.add_argument('--pieces', type=int, default=3)
+    make.add_argument('--out', default=DEFAULT_DIR)
+
+    ask = commands.add_parser('probe', help="look up a position")
+    ask.add_argument('--position', required=True, help="position like dame.read_position reads it")
+    ask.add_argument('--dir', default=DEFAULT_DIR)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        build(args.pieces, args.out, verbose=True)
+    else:
+        board, white_pieces, black_pieces, for_white = dm.read_position(args.position)
+        tablebase = Tablebase(args.dir)
+        found = tablebase.probe(board, white_pieces, black_pieces, for_white)
+        print(f"{dm.name[for_white]} to move: {describe(found)}")
+        if found is not None:
+            for turn in dm.generate_turns(for_white, board, white_pieces, black_pieces):
+                undos = dm.make_turn(board, white_pieces, black_pieces, turn, for_white)
+                print(f"    {dm.turn_name(turn)}: {dm.name[not for_white]} to move, "
+                      f"{describe(tablebase.probe(board, white_pieces, black_pieces, not for_white))}")
+                dm.unmake_turn(board, white_pieces, black_pieces, undos)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+'''
+    The table-driven evaluation against the scores of the old eval_board, which looped over the pieces.
+
+    The scores below were worked out with the old eval_board, with the default weights.
+    The old loops let board indices of -1 wrap around to the other side of the board, so near the edges
+    they sometimes saw a piece or an empty square that isn't really there. The tables don't, so for the
+    WRAPPED positions the scores differ on purpose: those list both the old scores and the right ones.
+
+        python -m pytest test_evaluation.py
+'''
+
+import numpy as np
+import pytest
+
+import dame as dm
+from engine import evaluation as ev
+import engine
+
+
+# Position, old eval_board score for white, for black
+SCORES = [
+    ("W:Wa3,c3,e3,g3,b2,d2,f2,h2,a1,c1,e1,g1:Bb8,d8,f8,h8,a7,c7,e7,g7,b6,d6,f6,h6", 24, 24),
+    ("B:Wf6,f4,a3,e3,b2,d2,h2,a1,c1,e1,g1:Bb8,d8,f8,h8,c7,e7,d6,h6,c5,e5", 16, 24),
+    ("W:Wa5,h4,c3,e3,g3,b2,f2,a1,c1,g1:Bb8,f8,h8,a7,c7,e7,g7,b6,e5,g5", 22, 17),
+    ("W:Wh6,g5,a3,e3,g3,b2,f2,h2,a1,c1,e1:Bb8,d8,f8,h8,a7,e7,g7,d6,b4", 24, 15),
+    ("W:Wa7,Kg7,Kc5:Bg5,Kc3,Kg3,f2", 10, 12),
+    ("W:Wc3,a1:Bb8,f8,h8,c7,b6,d6,Ke3,Ke1", 4, 20),
+    ("B:WKc7,c5:Ba7,Ke3,b2,Kc1", 6, 12),
+    ("W:WKb8,b6:Bh6,e5,Kd2", 6, 8),
+    ("W:Wf6,Kc5,e5,b2,d2,a1,c1,e1,g1:Bf8,h8,g7,e3", 22, 5),
+]
+
+# Position, old scores for white and black (wrapped around), the scores without wrapping around
+WRAPPED = [
+    ("W:WKb8,a3:Bf8,h8,a7,d6,f6,c5,Kg5,f4,d2", (16, 17), (6, 20)),
+    ("B:WKb6,b4,f2,e1:Bb8,a7,Kc3", (6, 17), (4, 20)),
+    ("W:Wf4,c3,g3,b2,d2,f2,h2,a1,c1,e1,g1:Bb8,d8,f8,h8,a7,c7,e7,g7,b6,f6,h6,a3", (24, 21), (22, 24)),
+]
+
+EXPECTED = SCORES + [(text, white, black) for text, _, (white, black) in WRAPPED]
+
+
+@pytest.fixture(autouse=True)
+def default_weights():
+    '''
+        The scores are those of the default weights, whatever weights.json says.
+    '''
+    weights = dict(ev.WEIGHTS)
+    ev.set_weights(ev.DEFAULT_WEIGHTS)
+    yield
+    ev.set_weights(weights)
+
+
+@pytest.mark.parametrize("text, white, black", EXPECTED)
+def test_evaluate(text, white, black):
+    codes = engine.Position.read(text).codes()
+    assert (ev.evaluate(codes, True), ev.evaluate(codes, False)) == (white, black)
+
+
+@pytest.mark.parametrize("text, white, black", EXPECTED)
+def test_eval_board(text, white, black):
+    board, white_pieces, black_pieces, _ = dm.read_position(text)
+    assert dm.eval_board(board, white_pieces, black_pieces, True) == white
+    assert dm.eval_board(board, white_pieces, black_pieces, False) == black
+
+
+def test_evaluate_batch():
+    positions = [engine.Position.read(text) for text, _, _ in EXPECTED]
+    boards = np.array([position.board() for position in positions])
+    codes = np.array([position.codes() for position in positions])
+
+    for for_white, column in ((True, 1), (False, 2)):
+        expected = [fixture[column] for fixture in EXPECTED]
+        assert ev.evaluate_batch(boards, for_white).tolist() == expected
+        assert ev.evaluate_batch(codes, for_white).tolist() == expected
+
+
+@pytest.mark.parametrize("text, old, new", WRAPPED)
+def test_no_wrapping_around(text, old, new):
+    codes = engine.Position.read(text).codes()
+    scores = (ev.evaluate(codes, True), ev.evaluate(codes, False))
+    assert scores == new and scores != old
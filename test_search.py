@@ -0,0 +1,117 @@
+'''
+    The search against a plain minimax that looks at every move, on random positions.
+
+    The alpha-beta search, its transposition table and its move ordering only save work:
+    with the captures not played out at the end of the lines (quiescence 0), it has to pick the very
+    move and score the minimax does. A position and its mirror with the other player to move
+    have to get the same score too, with or without quiescence, and whichever was searched first.
+    Sharing the moves of the root out among worker processes mustn't change the move or the score either.
+
+        python -m pytest test_search.py
+'''
+
+import random
+from functools import lru_cache
+
+import pytest
+
+import dame as dm
+import dame_ai as dai
+import engine
+from engine import transposition as tt
+
+
+def searcher(quiescence: int):
+    '''
+        A Search with a small table, the positions here don't need more.
+    '''
+    return engine.Search(quiescence, tt.TranspositionTable(megabytes=0.1))
+
+@lru_cache
+def random_positions(count: int, seed: int, most_plies: int = 60):
+    '''
+        count positions reached by random play from the start (ones with a move left to make).
+    '''
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = engine.Position.start()
+        for _ in range(rng.randrange(most_plies)):
+            moves = position.moves()
+            if not moves:
+                break
+            position = position.play(rng.choice(moves))
+        if position.moves():
+            positions.append(position)
+    return tuple(positions)
+
+
+def minimax(position: engine.Position, plies: int):
+    '''
+        Score of a position for the player to move, every line plies moves deep. The ends of the lines
+        are scored for the player who just moved there, who's the one searching.
+    '''
+    if plies == 0:
+        return -engine.evaluate(position, not position.white_to_move)
+
+    moves = position.moves()
+    if not moves:
+        return -float('inf')
+    return max(-minimax(position.play(move), plies - 1) for move in moves)
+
+def minimax_move(position: engine.Position, depth: int):
+    '''
+        The (move, score) Search.choose_move has to come up with: the first of the best moves,
+        or the first that leaves the enemy without a move when the game is won.
+    '''
+    moves = position.moves()
+    scores = [-minimax(position.play(move), 2*depth) for move in moves]
+    best = max(scores)
+
+    if best == float('inf') and depth > 0:
+        for move in moves:
+            if not position.play(move).moves():
+                return move, best
+
+    return moves[scores.index(best)], best
+
+
+@pytest.mark.parametrize("depth, count", [(0, 40), (1, 20), (2, 6)])
+def test_same_as_minimax(depth, count):
+    search = searcher(0) # Kept between the positions, so the table is shared too
+    for position in random_positions(count, seed=depth):
+        assert search.choose_move(position, depth) == minimax_move(position, depth), position.text()
+
+
+@pytest.mark.parametrize("quiescence", [0, 2, 3, engine.QUIESCENCE_NODES])
+def test_mirror_same_score(quiescence):
+    # Small quiescence budgets run out in the middle of the captures, where the order they're played in matters
+    for position in random_positions(150, seed=25):
+        mirror = position.mirror()
+        for depth in (0, 1):
+            score = searcher(quiescence).choose_move(position, depth)[1]
+            assert searcher(quiescence).choose_move(mirror, depth)[1] == score, position.text()
+
+            # With the table the mirror left behind
+            shared = searcher(quiescence)
+            shared.choose_move(mirror, depth)
+            assert shared.choose_move(position, depth)[1] == score, position.text()
+
+
+def test_parallel_same_as_serial():
+    robots = {}
+    try:
+        for position in random_positions(8, seed=30):
+            board, white_pieces, black_pieces, for_white = dm.read_position(position.text())
+            game = dm.Dame(board, white_pieces, black_pieces)
+            if for_white not in robots:
+                robots[for_white] = dai.Dame_AI(None, for_white, processes=2)
+            parallel = robots[for_white]
+            parallel.game = game
+            serial = dai.Dame_AI(game, for_white)
+
+            for depth in (1, 2):
+                assert parallel.choose_move(depth) == serial.choose_move(depth), position.text()
+    finally:
+        for robot in robots.values():
+            robot.close()
@@ -0,0 +1,159 @@
+'''
+    Tunes the weights of the board evaluation (see engine/evaluation.py) to played games, the Texel way.
+
+    Every position of the games says who won in the end. The evaluation is good if the score of
+    a position (white's score minus black's) tells how likely it was that white won from there:
+    chance = 1 / (1 + e^-score). With the score being the counts of the terms of engine/evaluation.py
+    (FEATURES) times their weights, finding the weights is a logistic regression, with a draw
+    counting as half a win for both.
+
+    The positions come from game records files (see records.py), which can hold millions of them.
+    They are turned into term counts in batches of BATCH positions at a time, all at once with NumPy,
+    and the regression is fitted with Newton's method on those counts, a handful of passes in all.
+    Positions where the player to move has to jump are left out, the search never scores those.
+
+    The weights are scaled to whole numbers (the piece weight being --piece) and written to a JSON file,
+    by default weights.json next to the game, which engine/evaluation.py reads whenever it's loaded.
+
+        python tune.py games.rec
+        python tune.py games.rec more.rec --out tuned.json --piece 20
+'''
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from engine import evaluation as ev
+from engine import bitboard as bb
+import records
+
+
+BATCH = 1 << 16 # Positions turned into term counts at once
+ITERATIONS = 25
+TOLERANCE = 1e-9 # Stop once the loss gets better by less than this
+REGULARIZATION = 1e-6 # Keeps the fit from running away when some term never counts
+
+
+def features(data: np.array, quiet_only: bool = True):
+    '''
+        The (white's minus black's) term counts and the results (1 white won, 0.5 draw, 0 black won)
+        of an array of records, as an (N, len(FEATURES)) float array and an (N,) array.
+    '''
+    counts, results = [], []
+    for start in range(0, len(data), BATCH):
+        batch = np.asarray(data[start:start + BATCH])
+        if quiet_only:
+            batch = batch[~bb.can_jump_batch(batch['white_to_move'].astype(bool), batch['position'])]
+
+        boards = records.boards(batch)
+        counts.append(ev.features_batch(boards, True) - ev.features_batch(boards, False))
+        results.append((batch['result'] + 1) / 2)
+
+    if not counts:
+        return np.zeros((0, len(ev.FEATURES))), np.zeros(0)
+    return np.concatenate(counts).astype(float), np.concatenate(results)
+
+
+def loss(x: np.array, y: np.array, weights: np.array):
+    '''
+        Mean cross entropy between the results and the chances the weights give.
+    '''
+    scores = x @ weights
+    # log(1 + e^-s) and log(1 + e^s), without overflowing
+    return float(np.mean(y * np.logaddexp(0, -scores) + (1 - y) * np.logaddexp(0, scores)))
+
+
+def fit(x: np.array, y: np.array, weights: np.array = None, iterations: int = ITERATIONS, verbose: bool = False):
+    '''
+        The weights that fit the chances of winning best (by Newton's method), starting from weights if given.
+    '''
+    weights = np.zeros(x.shape[1]) if weights is None else np.array(weights, dtype=float)
+    last = loss(x, y, weights)
+
+    for i in range(iterations):
+        gradient = np.zeros_like(weights)
+        hessian = REGULARIZATION * len(x) * np.eye(len(weights))
+        for start in range(0, len(x), BATCH):
+            batch, outcome = x[start:start + BATCH], y[start:start + BATCH]
+            chance = 1 / (1 + np.exp(-(batch @ weights)))
+            gradient += batch.T @ (chance - outcome)
+            hessian += (batch * (chance * (1 - chance))[:, None]).T @ batch
+
+        weights -= np.linalg.solve(hessian, gradient + REGULARIZATION * len(x) * weights)
+        now = loss(x, y, weights)
+        if verbose:
+            print(f"    pass {i+1}: loss {now:.6f}")
+        if last - now < TOLERANCE:
+            break
+        last = now
+
+    return weights
+
+
+def scale(x: np.array, y: np.array, weights: list):
+    '''
+        The factor that turns the scores of some weights into the best chances of winning
+        (the Texel K), so differently scaled weights can be compared.
+    '''
+    scores = (x @ np.array(weights, dtype=float))[:, None]
+    return fit(scores, y)[0]
+
+
+def whole_weights(fitted: np.array, piece: int):
+    '''
+        Fitted weights as whole numbers, scaled so a piece is worth piece.
+    '''
+    if not np.all(np.isfinite(fitted)):
+        raise ValueError("The fit ran away, the games don't tell the terms apart well enough to tune on.")
+    per_piece = fitted[ev.FEATURES.index('piece')]
+    if per_piece <= 0:
+        raise ValueError("The games say pieces are worth nothing, there's not enough of them to tune on.")
+    return {feature: int(round(weight / per_piece * piece)) for feature, weight in zip(ev.FEATURES, fitted)}
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Fit the evaluation weights to the outcomes of played games.")
+    parser.add_argument('games', nargs='+', help="game records files (see records.py)")
+    parser.add_argument('--out', default=ev.WEIGHTS_PATH, help="where to write the weights (weights.json next to the game)")
+    parser.add_argument('--piece', type=int, default=10, help="what a piece is worth, the other weights are scaled to it")
+    parser.add_argument('--all', action='store_true', help="also use positions where a jump has to be made")
+    args = parser.parse_args(argv)
+
+    x, y = [], []
+    for path in args.games:
+        counts, results = features(records.load(path), quiet_only=not args.all)
+        x.append(counts)
+        y.append(results)
+    x, y = np.concatenate(x), np.concatenate(y)
+    if len(x) == 0:
+        sys.exit("No positions to tune on.")
+    if np.all(y == y[0]):
+        sys.exit("All the games ended the same way, there are no wins and losses to tell good positions from bad ones.")
+    print(f"{len(x)} positions, white won {np.mean(y):.1%} of the points.")
+
+    try:
+        fitted = fit(x, y, verbose=True)
+        weights = whole_weights(fitted, args.piece)
+
+        now = np.array(ev.weight_vector())
+        before = loss(x, y, now * scale(x, y, now))
+        tuned = np.array([weights[feature] for feature in ev.FEATURES])
+        after = loss(x, y, tuned * scale(x, y, tuned))
+    except (ValueError, OverflowError) as error: # np.linalg.LinAlgError is a ValueError too
+        sys.exit(f"Can't tune on these games: {error}")
+
+    print(f"{'feature':<15} {'now':>5} {'tuned':>6}")
+    for feature in ev.FEATURES:
+        print(f"{feature:<15} {ev.WEIGHTS[feature]:>5} {weights[feature]:>6}")
+    print(f"loss {before:.6f} -> {after:.6f}")
+
+    with open(args.out, 'w') as file:
+        json.dump({'weights': weights, 'positions': len(x), 'loss': after, 'loss_before': before,
+                   'games': args.games}, file, indent=4)
+    print(f"Wrote {args.out}" + (", the robot uses it from the next start on." if args.out == ev.WEIGHTS_PATH else "."))
+
+
+if __name__ == "__main__":
+    main()